@@ -0,0 +1,207 @@
+"""
+Benchmark runner: times the model stack across k and corpus size, records peak memory,
+and checks time (relative to a reference loop) and memory against a stored baseline.
+
+  python benchmarks/run.py                       # run, write out_bench.json
+  python benchmarks/run.py --compare benchmarks/baseline.json
+  python benchmarks/run.py --save-baseline       # refresh benchmarks/baseline.json
+"""
+from __future__ import annotations
+import argparse
+import datetime
+import json
+from pathlib import Path
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from llm_nature.char_ngram import NGramModel
+from llm_nature.dataset import QAItem, load_paragraph, load_qa_corpus
+from llm_nature.instrument import run_main
+from llm_nature.metrics import cross_entropy
+from llm_nature.qa import QAReranker
+from llm_nature.word_ngram import WordNGram
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+KS = (1, 3, 6)
+TEXT_SCALES = (10, 100, 1000)
+QA_SCALES = (1, 10, 100)
+
+Case = Callable[[int, int], Tuple[Callable[[], object], int]]
+CASES: Dict[str, Tuple[Case, Tuple[int, ...]]] = {}
+
+def case(name: str, scales: Tuple[int, ...]):
+    """Register a case: f(k, scale) does the setup and returns (timed callable, work units)."""
+    def register(f: Case) -> Case:
+        CASES[name] = (f, scales)
+        return f
+    return register
+
+def qa_items(scale: int) -> List[QAItem]:
+    """The QA corpus repeated `scale` times, each copy made distinct so rows do not collapse."""
+    base = load_qa_corpus()
+    return [QAItem(q=f"{it.q} variant {i}", a=f"{it.a} variant {i}")
+            for i in range(scale) for it in base]
+
+def fitted(k: int, scale: int) -> Tuple[NGramModel, object]:
+    pairs = NGramModel.pair_view(load_paragraph() * scale, k)
+    m = NGramModel(k=k)
+    m.fit(pairs)
+    return m, pairs
+
+@case("ngram.fit", TEXT_SCALES)
+def bench_fit(k, scale):
+    pairs = NGramModel.pair_view(load_paragraph() * scale, k)
+    return (lambda: NGramModel(k=k).fit(pairs)), len(pairs)
+
+@case("ngram.prob", TEXT_SCALES)
+def bench_prob(k, scale):
+    m, pairs = fitted(k, scale)
+    sample = list(pairs[:20_000])
+    return (lambda: [m.prob(x, y) for x, y in sample]), len(sample)
+
+@case("ngram.log_prob_pairs", TEXT_SCALES)
+def bench_log_prob_pairs(k, scale):
+    m, pairs = fitted(k, scale)
+    return (lambda: m.log_prob_pairs(pairs)), len(pairs)
+
+@case("metrics.cross_entropy", TEXT_SCALES)
+def bench_cross_entropy(k, scale):
+    m, pairs = fitted(k, scale)
+    return (lambda: cross_entropy(m.prob, pairs)), len(pairs)
+
+@case("word.fit_text", QA_SCALES)
+def bench_word_fit(k, scale):
+    text = QAReranker.corpus_text(qa_items(scale))
+    return (lambda: WordNGram(k=k).fit_text(text)), len(text.split())
+
+@case("word.score_answer_only", QA_SCALES)
+def bench_score_answer_only(k, scale):
+    items = qa_items(scale)
+    lm = WordNGram(k=k)
+    lm.fit_text(QAReranker.corpus_text(items))
+    qs = [it.q for it in load_qa_corpus()]
+    return (lambda: [lm.score_answer_only(q, it.a) for q in qs for it in items]), len(qs) * len(items)
+
+@case("qa.answer", QA_SCALES)
+def bench_answer(k, scale):
+    items = qa_items(scale)
+    rr = QAReranker(k=k, alpha=0.5, lam=0.2)
+    rr.fit(items)
+    qs = [it.q for it in load_qa_corpus()]
+    return (lambda: [rr.answer(q) for q in qs]), len(qs)
+
+REF_TEXT = "".join(chr(97 + i * 7919 % 26) for i in range(50_000))
+
+def reference() -> None:
+    """A fixed dict-counting loop, independent of llm_nature; case times are stored relative to it."""
+    counts: Dict[str, int] = {}
+    for i in range(len(REF_TEXT) - 3):
+        key = REF_TEXT[i:i + 3]
+        counts[key] = counts.get(key, 0) + 1
+
+def measure(fn: Callable[[], object], repeat: int) -> Tuple[float, float, int]:
+    """
+    (best wall time of `repeat` runs, best time of reference() run between them, peak traced
+    bytes of one more run). Interleaving puts both timings under the same machine load.
+    """
+    best = ref = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        t1 = time.perf_counter()
+        reference()
+        best = min(best, t1 - t0)
+        ref = min(ref, time.perf_counter() - t1)
+    # Traced separately: tracemalloc slows allocation-heavy code several-fold.
+    # Under --profile tracing is already on, so measure from the current level instead.
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    if not tracing:
+        tracemalloc.stop()
+    return best, ref, peak
+
+def run(names: List[str], quick: bool, repeat: int) -> List[dict]:
+    rows = []
+    for name in names:
+        f, scales = CASES[name]
+        for k in KS:
+            for scale in scales[:2] if quick else scales:
+                fn, units = f(k, scale)
+                seconds, ref, peak = measure(fn, repeat)
+                rows.append({"case": name, "k": k, "scale": scale, "units": units,
+                             "seconds": seconds, "units_per_sec": units / seconds if seconds else 0.0,
+                             "relative": seconds / ref, "peak_bytes": peak})
+                print(f"{name:26s} k={k} scale={scale:<5d} {seconds * 1e3:9.2f} ms  "
+                      f"{units / seconds:12.0f}/s  {seconds / ref:8.3f}x ref  peak {peak / 1024:9.1f} KiB")
+    return rows
+
+def compare(rows: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """Regressions: time relative to the reference loop, or peak memory, above baseline * (1 + tolerance)."""
+    base = {(r["case"], r["k"], r["scale"]): r for r in baseline}
+    out = []
+    for r in rows:
+        b = base.get((r["case"], r["k"], r["scale"]))
+        if b is None:
+            continue
+        for field in ("relative", "peak_bytes"):
+            if b[field] and r[field] > b[field] * (1 + tolerance):
+                out.append(f"{r['case']} k={r['k']} scale={r['scale']}: {field} "
+                           f"{r[field]:.4g} vs baseline {b[field]:.4g} ({r[field] / b[field]:.2f}x)")
+    return out
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("cases", nargs="*", help=f"subset of: {', '.join(CASES)}")
+    ap.add_argument("--out", default=str(ROOT / "out_bench.json"))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--quick", action="store_true", help="only the two smallest scales")
+    ap.add_argument("--compare", metavar="JSON", help="baseline results to check against")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--save-baseline", action="store_true", help=f"also write {BASELINE.name}")
+    args = ap.parse_args(argv)
+
+    unknown = [c for c in args.cases if c not in CASES]
+    if unknown:
+        ap.error(f"unknown cases: {', '.join(unknown)}")
+    rows = run(args.cases or list(CASES), args.quick, args.repeat)
+    result = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": rows,
+    }
+    outputs = [(Path(args.out), result)]
+    if args.save_baseline:
+        # Machine-independent fields only: no wall times, dates or platform.
+        keep = ("case", "k", "scale", "units", "relative", "peak_bytes")
+        outputs.append((BASELINE, {"meta": {"python": platform.python_version()},
+                                   "results": [{f: r[f] for f in keep} for r in rows]}))
+    for path, data in outputs:
+        path.write_text(json.dumps(data, indent=1) + "\n", encoding="utf-8")
+        print(f"Wrote {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))["results"]
+        regressions = compare(rows, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.compare}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run_main(main))
@@ -0,0 +1,6 @@
+import sys
+
+from .cli import main
+from .instrument import run_main
+
+sys.exit(run_main(main))
@@ -0,0 +1,74 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from .dataset import QAItem
+from .persist import VERSION as MODEL_VERSION
+from .word_ngram import WordNGram
+
+# Bump when anything that feeds a cached result changes (tokenizer, scoring, file layout).
+CACHE_VERSION = 1
+
+PathLike = Union[str, Path]
+
+def corpus_hash(items: Iterable[QAItem]) -> str:
+    """sha256 of the items' questions and answers, in order."""
+    h = hashlib.sha256()
+    for it in items:
+        h.update(json.dumps([it.q, it.a]).encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+class ResultCache:
+    """On-disk store keyed by the sha256 of each entry's parameters; writes are atomic."""
+
+    def __init__(self, root: PathLike):
+        self.root = Path(root)
+
+    def key(self, kind: str, **params) -> str:
+        blob = json.dumps({"kind": kind, "version": [CACHE_VERSION, MODEL_VERSION], **params},
+                          sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def path(self, key: str, suffix: str) -> Path:
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def _publish(self, path: Path, write) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            write(tmp)
+            os.replace(tmp, path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def load_lm(self, key: str) -> Optional[WordNGram]:
+        path = self.path(key, ".ngram")
+        return WordNGram.load(path) if path.exists() else None
+
+    def save_lm(self, key: str, lm: WordNGram) -> None:
+        self._publish(self.path(key, ".ngram"), lm.save)
+
+    def load_json(self, key: str):
+        path = self.path(key, ".json")
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def save_json(self, key: str, value) -> None:
+        text = json.dumps(value, separators=(",", ":"))
+        self._publish(self.path(key, ".json"), lambda p: p.write_text(text, encoding="utf-8"))
+
+    def clear(self) -> int:
+        """Delete every entry; returns how many files were removed."""
+        removed = 0
+        if self.root.exists():
+            for p in self.root.glob("*/*"):
+                if p.suffix in (".ngram", ".json"):
+                    p.unlink()
+                    removed += 1
+        return removed
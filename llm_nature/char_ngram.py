@@ -1,7 +1,33 @@
 from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Tuple, Iterable, Set
+from typing import Dict, Tuple, Iterable, Mapping, Sequence, Set
+import heapq
+from itertools import chain, islice
 import math
+import random
+import sys
+from . import instrument
+from .pairs import PairView, iter_batches
+from .sampling import LRU, NextTable, next_table
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+# log_prob_pairs on fewer pairs than this loops over prob(): for the handful of boundary
+# pairs in a QA score, building column batches (and NumPy arrays) costs more than it saves.
+SCALAR_PAIRS = 32
+
+def sum_log_probs(lps) -> float:
+    return float(lps.sum()) if hasattr(lps, "sum") else float(sum(lps))
+
+def _fit_shard(args: tuple) -> "NGramModel":
+    k, alpha, shard = args
+    m = NGramModel(k=k, alpha=alpha)
+    m.fit(shard)
+    return m
 
 @dataclass
 class NGramModel:
@@ -13,6 +39,8 @@ class NGramModel:
     k: int
     alpha: float = 0.5
 
+    SAMPLER_CACHE = 4096  # per-context sampling tables kept by next_table()
+
     def __post_init__(self) -> None:
         if self.k < 1:
             raise ValueError("k must be >= 1")
@@ -21,6 +49,7 @@ class NGramModel:
         self.counts: Dict[Tuple[str, str], int] = {}
         self.context_totals: Dict[str, int] = {}
         self.vocab: Set[str] = set()
+        self.target_pairs: Dict[str, int] = {}  # y -> number of stored (x, y) entries
 
     @staticmethod
     def build_pairs(text: str, k: int) -> list[tuple[str, str]]:
@@ -29,13 +58,363 @@ class NGramModel:
             x = text[i:i+k]
             y = text[i+k]
             pairs.append((x, y))
+        stats = instrument.STATS
+        if stats is not None:
+            stats.count("pairs.built", len(pairs))
         return pairs
 
-    def fit(self, pairs: Iterable[tuple[str, str]]) -> None:
+    @staticmethod
+    def pair_view(text: str, k: int) -> PairView:
+        """Same pairs as build_pairs, as a lazy index-based view over `text`."""
+        return PairView(text, k)
+
+    @staticmethod
+    def repeated_pair_counts(base: str, repeat: int, k: int) -> Dict[Tuple[str, str], int]:
+        """C(x,y) over build_pairs(base * repeat, k) in O(|base| + k), independent of repeat."""
+        L = len(base)
+        counts: Dict[Tuple[str, str], int] = {}
+        if L == 0:
+            return counts
+        ext = base * (k // L + 2)
+        for r in range(L):
+            n = repeat - (r + k) // L
+            if n <= 0:
+                continue
+            key = (ext[r:r+k], ext[r+k])
+            counts[key] = counts.get(key, 0) + n
+        return counts
+
+    @classmethod
+    def from_repeated(cls, base: str, repeat: int, k: int, alpha: float = 0.5) -> "NGramModel":
+        """Model fit on base * repeat, built from the base's counts without materializing the text."""
+        m = cls(k=k, alpha=alpha)
+        m.fit_counts(cls.repeated_pair_counts(base, repeat, k))
+        return m
+
+    def fit(self, pairs: Iterable[tuple[str, str]], workers: int = 1) -> None:
+        """Count pairs; workers > 1 shards a PairView across processes, other input runs serially."""
+        if workers > 1 and isinstance(pairs, PairView):
+            self.fit_parallel(pairs, workers)
+            return
+        stats = instrument.STATS
+        if stats is not None:
+            pairs = stats.counted("pairs.fit", pairs)
+        counts, totals, targets = self.counts, self.context_totals, self.target_pairs
         for x, y in pairs:
+            c = counts.get((x, y))
+            if c is None:
+                counts[(x, y)] = 1
+                targets[y] = targets.get(y, 0) + 1
+            else:
+                counts[(x, y)] = c + 1
+            totals[x] = totals.get(x, 0) + 1
+        self.vocab.update(targets)
+        self._invalidate()
+
+    def fit_text(self, text: str, workers: int = 1) -> None:
+        self.fit(self.pair_view(text, self.k), workers=workers)
+
+    def fit_stream(self, chunks: Iterable[str], workers: int = 1) -> None:
+        """
+        fit_text on the concatenation of chunks, holding one chunk at a time: the last k
+        characters are carried into the next chunk so pairs across chunk boundaries count.
+        """
+        carry = ""
+        for chunk in chunks:
+            text = carry + chunk
+            self.fit_text(text, workers=workers)
+            carry = text[-self.k:]
+
+    def fit_parallel(self, pairs: PairView, workers: int) -> None:
+        """
+        Count shards of the view in a process pool and merge them in order.
+        Counts (and their first-occurrence order) are identical to a serial fit.
+        """
+        shards = pairs.shards(workers)
+        jobs = [(self.k, self.alpha, shard) for shard in shards]
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            for part in ex.map(_fit_shard, jobs):
+                self.merge(part)
+
+    def merge(self, other: "NGramModel") -> None:
+        """Add another model's counts (same k) into this one."""
+        if other.k != self.k:
+            raise ValueError(f"cannot merge k={other.k} into k={self.k}")
+        targets = self.target_pairs
+        for key, c in other.counts.items():
+            old = self.counts.get(key)
+            if old is None:
+                targets[key[1]] = targets.get(key[1], 0) + 1
+            self.counts[key] = (old or 0) + c
+        for x, c in other.context_totals.items():
+            self.context_totals[x] = self.context_totals.get(x, 0) + c
+        self.vocab |= other.vocab
+        self._invalidate()
+
+    def fit_counts(self, counts: Mapping[Tuple[str, str], int]) -> None:
+        """Like fit() on a multiset of pairs given as {(x, y): multiplicity}."""
+        for (x, y), c in counts.items():
+            if c <= 0:
+                continue
             self.vocab.add(y)
-            self.counts[(x, y)] = self.counts.get((x, y), 0) + 1
-            self.context_totals[x] = self.context_totals.get(x, 0) + 1
+            old = self.counts.get((x, y))
+            if old is None:
+                self.target_pairs[y] = self.target_pairs.get(y, 0) + 1
+            self.counts[(x, y)] = (old or 0) + c
+            self.context_totals[x] = self.context_totals.get(x, 0) + c
+        self._invalidate()
+
+    def forget(self, pairs: Iterable[tuple[str, str]]) -> None:
+        """Undo fit(pairs): decrement their counts (they must have been fitted)."""
+        counts: Dict[Tuple[str, str], int] = {}
+        for key in pairs:
+            counts[key] = counts.get(key, 0) + 1
+        self.forget_counts(counts)
+
+    def forget_counts(self, counts: Mapping[Tuple[str, str], int], keep_vocab: bool = False) -> None:
+        """
+        Undo fit_counts(counts). Entries reaching zero are dropped, and so are targets no pair
+        still has unless keep_vocab.
+        """
+        for (x, y), c in counts.items():
+            if c > self.counts.get((x, y), 0):
+                raise ValueError(f"cannot forget {c} x {(x, y)!r}: only {self.counts.get((x, y), 0)} fitted")
+        dropped: Set[str] = set()
+        targets = self.target_pairs
+        for (x, y), c in counts.items():
+            if c <= 0:
+                continue
+            left = self.counts[(x, y)] - c
+            if left:
+                self.counts[(x, y)] = left
+            else:
+                del self.counts[(x, y)]
+                targets[y] -= 1
+                if not targets[y]:
+                    del targets[y]
+                    dropped.add(y)
+            left = self.context_totals[x] - c
+            if left:
+                self.context_totals[x] = left
+            else:
+                del self.context_totals[x]
+        if dropped and not keep_vocab:
+            self.vocab -= dropped
+        self._invalidate()
+
+    def table_bytes(self) -> Tuple[float, float]:
+        """Approximate bytes per stored (x, y) entry and per context (tables, keys and values)."""
+        n_pairs = len(self.counts) or 1
+        n_ctx = len(self.context_totals) or 1
+        pair = sys.getsizeof(self.counts) + sum(
+            sys.getsizeof(key) + sys.getsizeof(key[1]) + sys.getsizeof(c) for key, c in self.counts.items())
+        ctx = sys.getsizeof(self.context_totals) + sum(
+            sys.getsizeof(x) + sys.getsizeof(c) for x, c in self.context_totals.items())
+        return pair / n_pairs, ctx / n_ctx
+
+    def nbytes(self) -> int:
+        """Approximate size of the count tables in bytes."""
+        pair, ctx = self.table_bytes()
+        return round(pair * len(self.counts) + ctx * len(self.context_totals))
+
+    def prune_scores(self, method: str = "count") -> Dict[Tuple[str, str], float]:
+        """Per-entry cost of dropping it: C(x,y) ("count") or Stolcke's criterion ("entropy")."""
+        counts = self.counts
+        if method == "count":
+            return {key: float(c) for key, c in counts.items()}
+        if method != "entropy":
+            raise ValueError(f"unknown prune method {method!r}")
+        totals = self.context_totals
+        n = sum(totals.values())
+        a = self.alpha
+        aV = a * len(self.vocab)
+        out: Dict[Tuple[str, str], float] = {}
+        for (x, y), c in counts.items():
+            out[(x, y)] = self._entropy_cost(c, totals[x], n, a, aV)
+        return out
+
+    @staticmethod
+    def _entropy_cost(c: int, t: int, n: int, a: float, aV: float) -> float:
+        """Laplace-smoothed Stolcke cost of dropping C(x,y) = c from C(x,·) = t, out of n pairs."""
+        p = (c + a) / (t + aV)
+        return t / n * (p * math.log((c + a) / a) + math.log((t - c + aV) / (t + aV)))
+
+    def prune(self, threshold: float | None = None, max_bytes: int | None = None,
+              method: str = "count") -> int:
+        """
+        Drop entries scoring below threshold, then the lowest-scoring until nbytes() <= max_bytes.
+        The vocabulary is kept. Returns the number dropped.
+        """
+        scores = self.prune_scores(method)
+        order = sorted(scores, key=scores.__getitem__)
+        m = self._prune_cut([scores[key] for key in order], [x for x, _ in order], threshold, max_bytes)
+        counts = self.counts
+        self.forget_counts({key: counts[key] for key in order[:m]}, keep_vocab=True)
+        self._shrink()
+        return m
+
+    def _prune_cut(self, scores: Sequence[float], contexts: Sequence, threshold: float | None,
+                   max_bytes: int | None) -> int:
+        """How many of the entries (in ascending score order, with their contexts) prune() drops."""
+        pair, ctx = self.table_bytes()
+        n_pairs = len(scores)
+        left: Dict[object, int] = {}
+        for x in contexts:
+            left[x] = left.get(x, 0) + 1
+        n_ctx = len(left)
+        m = 0
+        for score, x in zip(scores, contexts):
+            over = max_bytes is not None and pair * n_pairs + ctx * n_ctx > max_bytes
+            if not over and (threshold is None or score >= threshold):
+                break
+            m += 1
+            n_pairs -= 1
+            left[x] -= 1
+            n_ctx -= left[x] == 0
+        return m
+
+    def _shrink(self) -> None:
+        # Deleting keys never shrinks a dict; copying does.
+        self.counts = dict(self.counts)
+        self.context_totals = dict(self.context_totals)
+
+    def _derived(self) -> dict:
+        """Caches derived from the counts (successor index, sampling tables); cleared on every update."""
+        d = self.__dict__.get("_derived_cache")
+        if d is None:
+            d = self.__dict__["_derived_cache"] = {}
+        return d
+
+    def _invalidate(self) -> None:
+        self.__dict__["_derived_cache"] = {}
+
+    def vocab_list(self) -> list:
+        """The vocabulary in sorted order (a stable order for sampling and dense vectors)."""
+        d = self._derived()
+        v = d.get("vocab")
+        if v is None:
+            v = d["vocab"] = sorted(self.vocab)
+        return v
+
+    def successors(self, x: str) -> Tuple[Sequence[str], Sequence[int]]:
+        """(ys, C(x,y)) for the observed successors of x, ys sorted; from an index built once per fit."""
+        d = self._derived()
+        index = d.get("successors")
+        if index is None:
+            grouped: Dict[str, list] = {}
+            for (cx, y), c in self.counts.items():
+                grouped.setdefault(cx, []).append((y, c))
+            index = d["successors"] = {cx: tuple(zip(*sorted(s))) for cx, s in grouped.items()}
+        return index.get(x, ((), ()))
+
+    def vocab_index(self) -> Dict[str, int]:
+        """Position of each symbol in vocab_list()."""
+        d = self._derived()
+        index = d.get("vocab_index")
+        if index is None:
+            index = d["vocab_index"] = {y: i for i, y in enumerate(self.vocab_list())}
+        return index
+
+    def next_probs(self, x: str) -> Tuple[Dict[str, float], float]:
+        """
+        ({y: p(y|x)} for the listed symbols, p of every other vocab symbol). Under Laplace
+        smoothing the listed symbols are the observed successors and the rest get alpha/(C(x,·)+alpha|V|).
+        """
+        V = len(self.vocab)
+        if V == 0:
+            raise ValueError("Model has empty vocab; call fit() first.")
+        ys, cs = self.successors(x)
+        a = self.alpha
+        den = sum(cs) + a * V
+        return {y: (c + a) / den for y, c in zip(ys, cs)}, a / den
+
+    def distribution(self, x: str):
+        """
+        p(.|x) over vocab_list() as a float64 NumPy array (a list without NumPy): the vector is
+        filled with the shared floor and only the listed successors are written.
+        """
+        listed, rest = self.next_probs(x)
+        index = self.vocab_index()
+        if np is not None:
+            out = np.full(len(index), rest)
+            if listed:
+                out[np.fromiter((index[y] for y in listed), dtype=np.int64, count=len(listed))] = \
+                    np.fromiter(listed.values(), dtype=np.float64, count=len(listed))
+            return out
+        out = [rest] * len(index)
+        for y, p in listed.items():
+            out[index[y]] = p
+        return out
+
+    def top_next(self, x: str, n: int) -> list[tuple[str, float]]:
+        """The n most likely next symbols as (y, p(y|x)), best first, ties in vocab_list() order."""
+        listed, rest = self.next_probs(x)
+        index = self.vocab_index()
+        ranked = sorted(((-p, index[y], y) for y, p in listed.items()))
+        floor = ((-rest, i, y) for i, y in enumerate(self.vocab_list()) if y not in listed)
+        return [(y, -p) for p, _, y in islice(heapq.merge(ranked, floor), n)]
+
+    def next_table(self, x: str, temperature: float = 1.0) -> NextTable:
+        """Sampling table for x, built on first use and kept in an LRU of SAMPLER_CACHE contexts."""
+        d = self._derived()
+        tables = d.get("tables")
+        if tables is None:
+            tables = d["tables"] = LRU(self.SAMPLER_CACHE)
+        key = (x, temperature)
+        t = tables.get(key)
+        if t is None:
+            listed, floor = self.next_probs(x)
+            ys, ws = list(listed), list(listed.values())
+            # Every unseen context has the same (uniform) table; build it once.
+            shared = (None, temperature) if not ys else None
+            t = tables.get(shared) if shared else None
+            if t is None:
+                t = next_table(ys, ws, floor, self.vocab_list(), temperature)
+                if shared:
+                    tables.put(shared, t)
+            tables.put(key, t)
+        return t
+
+    def sample_next(self, contexts: Sequence[str], rng: random.Random,
+                    temperature: float = 1.0) -> list:
+        """One draw from p(.|x) per context; each distinct context's table is fetched once."""
+        seen: Dict[str, NextTable] = {}
+        out = []
+        for x in contexts:
+            t = seen.get(x)
+            if t is None:
+                t = seen[x] = self.next_table(x, temperature)
+            out.append(t.sample(rng))
+        return out
+
+    def generate(self, prefix: str, n: int, temperature: float = 1.0,
+                 seed: int | None = None) -> str:
+        """n sampled characters continuing prefix (temperature 0 is greedy)."""
+        return self.generate_batch([prefix], n, temperature, seed)[0]
+
+    def generate_batch(self, prefixes: Sequence[str], n: int, temperature: float = 1.0,
+                       seed: int | None = None) -> list[str]:
+        """generate() for many prefixes, advanced in lockstep so shared contexts share tables."""
+        rng = random.Random(seed)
+        k = self.k
+        ctxs = [p[-k:] for p in prefixes]
+        outs: list[list[str]] = [[] for _ in prefixes]
+        for _ in range(n):
+            for i, y in enumerate(self.sample_next(ctxs, rng, temperature)):
+                outs[i].append(y)
+                ctxs[i] = (ctxs[i] + y)[-k:]
+        return ["".join(o) for o in outs]
+
+    def save(self, path) -> None:
+        """Write the counts in the binary format of persist.save_model."""
+        from .persist import save_model
+        save_model(self, path)
+
+    @staticmethod
+    def load(path, use_mmap: bool = True) -> "NGramModel":
+        """A CompactNGramModel over a file written by save(), memory-mapped by default."""
+        from .persist import load_model
+        return load_model(path, use_mmap=use_mmap)[0]
 
     def prob(self, x: str, y: str) -> float:
         V = len(self.vocab)
@@ -45,17 +424,64 @@ class NGramModel:
         c_x = self.context_totals.get(x, 0)
         return (c_xy + self.alpha) / (c_x + self.alpha * V)
 
-    def log_prob_pairs(self, pairs: Iterable[tuple[str, str]]) -> float:
-        lp = 0.0
-        for x, y in pairs:
-            p = self.prob(x, y)
+    def count_batch(self, contexts: Sequence[str],
+                    targets: Sequence[str]) -> tuple[Sequence[int], Sequence[int]]:
+        """(C(x,y), C(x,·)) for aligned contexts/targets."""
+        counts = self.counts
+        totals = self.context_totals
+        c_xy = [counts.get((x, y), 0) for x, y in zip(contexts, targets)]
+        c_x = [totals.get(x, 0) for x in contexts]
+        return c_xy, c_x
+
+    def log_prob_batch(self, contexts: Sequence[str], targets: Sequence[str]):
+        """
+        log p(y|x) for aligned contexts/targets in one shot.
+        Returns a float64 NumPy array when NumPy is installed, else a list of floats.
+        """
+        V = len(self.vocab)
+        if V == 0:
+            raise ValueError("Model has empty vocab; call fit() first.")
+        if len(contexts) != len(targets):
+            raise ValueError("contexts and targets must have the same length")
+        c_xy, c_x = self.count_batch(contexts, targets)
+        stats = instrument.STATS
+        if stats is not None:
+            stats.count("lookup.pairs", len(contexts))
+            stats.count("lookup.unseen_context", sum(1 for c in c_x if c == 0))
+            stats.count("lookup.unseen_pair", sum(1 for c in c_xy if c == 0))
+        a = self.alpha
+        aV = self.alpha * V
+        if np is not None:
+            p = (np.asarray(c_xy, dtype=np.float64) + a) / (np.asarray(c_x, dtype=np.float64) + aV)
+            bad = np.flatnonzero(p <= 0.0)
+            if len(bad):
+                j = int(bad[0])
+                raise ValueError(f"Non-positive probability p={p[j]} for ({contexts[j]!r},{targets[j]!r})")
+            return np.log(p)
+        out = []
+        for x, y, cxy, cx in zip(contexts, targets, c_xy, c_x):
+            p = (cxy + a) / (cx + aV)
             if p <= 0.0:
                 raise ValueError(f"Non-positive probability p={p} for ({x!r},{y!r})")
-            lp += math.log(p)
+            out.append(math.log(p))
+        return out
+
+    def log_prob_pairs(self, pairs: Iterable[tuple[str, str]]) -> float:
+        it = iter(pairs)
+        head = list(islice(it, SCALAR_PAIRS))
+        lp = 0.0
+        if len(head) < SCALAR_PAIRS:
+            for x, y in head:
+                p = self.prob(x, y)
+                if p <= 0.0:
+                    raise ValueError(f"Non-positive probability p={p} for ({x!r},{y!r})")
+                lp += math.log(p)
+            return lp
+        for xs, ys in iter_batches(chain(head, it)):
+            lp += sum_log_probs(self.log_prob_batch(xs, ys))
         return lp
 
     def log_prob_text(self, text: str) -> float:
         if len(text) <= self.k:
             return 0.0
-        pairs = self.build_pairs(text, self.k)
-        return self.log_prob_pairs(pairs)
+        return self.log_prob_pairs(self.pair_view(text, self.k))
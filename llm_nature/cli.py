@@ -0,0 +1,54 @@
+"""
+python -m llm_nature <report> [...]: the qa_* reports behind one entry point.
+
+  python -m llm_nature all                 # every report, each model fitted once
+  python -m llm_nature ablate thresholds   # a subset, in order
+  python -m llm_nature --no-cache recall   # fit in memory only
+  python -m llm_nature --workers 4 all     # fit and score uncached k in 4 processes
+  python -m llm_nature clear-cache
+
+Fitted LMs and score matrices are cached under --cache-dir (default .llm_nature_cache/).
+"""
+from __future__ import annotations
+import argparse
+from typing import List, Optional
+
+from .cache import ResultCache
+from .dataset import ROOT
+from .experiments import REPORTS, Experiment
+
+DEFAULT_CACHE = ROOT / ".llm_nature_cache"
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m llm_nature",
+                                 description=__doc__.strip().splitlines()[0])
+    ap.add_argument("reports", nargs="+", metavar="report",
+                    help=f"one or more of: {', '.join(REPORTS)}, all, clear-cache")
+    ap.add_argument("--alpha", type=float, default=0.5)
+    ap.add_argument("--cache-dir", default=str(DEFAULT_CACHE))
+    ap.add_argument("--no-cache", action="store_true", help="do not read or write the cache")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="processes for fitting and scoring uncached k (default 1)")
+    args = ap.parse_args(argv)
+
+    choices = set(REPORTS) | {"all", "clear-cache"}
+    unknown = [r for r in args.reports if r not in choices]
+    if unknown:
+        ap.error(f"unknown reports: {', '.join(unknown)}")
+
+    cache = ResultCache(args.cache_dir)
+    if "clear-cache" in args.reports:
+        print(f"Removed {cache.clear()} cached entries from {cache.root}")
+    names = [r for r in args.reports if r != "clear-cache"]
+    if "all" in names:
+        names = list(REPORTS)
+    if not names:
+        return 0
+
+    exp = Experiment(alpha=args.alpha, cache=None if args.no_cache else cache,
+                     workers=args.workers)
+    for i, name in enumerate(names):
+        if len(names) > 1:
+            print(("\n" if i else "") + f"# {name}")
+        REPORTS[name](exp)
+    return 0
@@ -0,0 +1,448 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterable, List, Mapping, Sequence, Set, Tuple
+
+from . import instrument
+from .char_ngram import NGramModel, np
+from .pairs import SLOT_BITS, PairView, pack_context, unpack_context
+
+_MAX_CODE = (1 << 63) - 1
+
+def _store(values: List[int]):
+    """Pack sorted non-negative ints into array('q'), or keep a list if they overflow 64 bits."""
+    if values and values[-1] > _MAX_CODE:
+        return values
+    return array("q", values)
+
+def _find(keys: Sequence[int], code: int) -> int:
+    j = bisect_left(keys, code)
+    if j < len(keys) and keys[j] == code:
+        return j
+    return -1
+
+def merge_sorted_counts(keys: Sequence[int], counts: Sequence[int],
+                        new: Iterable[Tuple[int, int]], out_k=None) -> Tuple[Sequence[int], array]:
+    """
+    Merge sorted (code, count) items into sorted parallel key/count sequences, adding counts.
+    Keys go to `out_k` (default a new list; pass array('q') when every code fits in 64 bits).
+    """
+    if out_k is None:
+        out_k = []
+    out_c = array("q")
+    i = 0
+    n = len(keys)
+    for code, c in new:
+        while i < n and keys[i] < code:
+            out_k.append(keys[i])
+            out_c.append(counts[i])
+            i += 1
+        if i < n and keys[i] == code:
+            c += counts[i]
+            i += 1
+        out_k.append(code)
+        out_c.append(c)
+    out_k.extend(keys[i:])
+    out_c.extend(counts[i:])
+    return out_k, out_c
+
+def gather_counts(keys: Sequence[int], vals: Sequence[int], codes: Sequence[int]):
+    """vals[j] where keys[j] == code, else 0, for each code (negative codes never match)."""
+    if np is not None and isinstance(keys, (array, memoryview)) and (not codes or max(codes) <= _MAX_CODE):
+        q = np.asarray(codes, dtype=np.int64)
+        if len(keys) == 0:
+            return np.zeros(len(q), dtype=np.int64)
+        k = np.frombuffer(keys, dtype=np.int64)
+        v = np.frombuffer(vals, dtype=np.int64)
+        j = np.minimum(np.searchsorted(k, q), len(k) - 1)
+        return np.where(k[j] == q, v[j], 0)
+    out: List[int] = []
+    for code in codes:
+        j = _find(keys, code) if code >= 0 else -1
+        out.append(vals[j] if j >= 0 else 0)
+    return out
+
+@dataclass
+class CompactNGramModel(NGramModel):
+    """
+    NGramModel with integer-encoded, array-backed count tables: a pair is one int,
+    (context << sym_bits) | id(y), and counts live in sorted arrays searched with bisect.
+    packed=True stores a WordNGram model (contexts are pack_context codes).
+    """
+    packed: bool = False
+    ROW_CACHE = 8192  # contexts whose table row prob() keeps (LRU)
+
+    def __post_init__(self) -> None:
+        if self.k < 1:
+            raise ValueError("k must be >= 1")
+        if self.alpha <= 0:
+            raise ValueError("alpha must be > 0")
+        self.vocab: Set[str] = set()
+        self.symbols: Dict[str, int] = {}
+        self.id_to_symbol: List[str] = []
+        self.sym_bits = 1
+        self.ctx_keys = array("q")
+        self.ctx_totals = array("q")
+        self.pair_keys = array("q")
+        self.pair_counts = array("q")
+        self._invalidate()
+
+    def _repack(self, code: int, slots: int, old: int, new: int) -> int:
+        mask = (1 << old) - 1
+        out = 0
+        for s in range(slots):
+            out |= ((code >> (old * s)) & mask) << (new * s)
+        return out
+
+    def _widen(self, bits: int, pending: Dict[int, int]) -> None:
+        old = self.sym_bits
+        k = self.k
+        # Fixed-width packing keeps numeric order == lexicographic id order, so re-encoding
+        # preserves the sort of the stored keys.
+        self.ctx_keys = _store([self._repack(c, k, old, bits) for c in self.ctx_keys])
+        self.pair_keys = _store([self._repack(c, k + 1, old, bits) for c in self.pair_keys])
+        repacked = {self._repack(c, k + 1, old, bits): n for c, n in pending.items()}
+        pending.clear()
+        pending.update(repacked)
+        self.sym_bits = bits
+
+    def _intern(self, s: str, pending: Dict[int, int]) -> int:
+        i = self.symbols.get(s)
+        if i is None:
+            i = len(self.id_to_symbol)
+            self.symbols[s] = i
+            self.id_to_symbol.append(s)
+            if i.bit_length() > self.sym_bits:
+                self._widen(i.bit_length(), pending)
+        return i
+
+    def context_symbols(self, x) -> Sequence | None:
+        if self.packed:
+            return unpack_context(x, self.k) if isinstance(x, int) else None
+        return x if len(x) == self.k else None
+
+    def encode_context(self, x: str) -> int | None:
+        """Packed context code, or None if x has the wrong length or an unseen symbol."""
+        syms = self.context_symbols(x)
+        if syms is None:
+            return None
+        b = self.sym_bits
+        code = 0
+        for ch in syms:
+            i = self.symbols.get(ch)
+            if i is None:
+                return None
+            code = (code << b) | i
+        return code
+
+    def _encode_pair(self, x: str, y: str, pending: Dict[int, int]) -> int:
+        syms = self.context_symbols(x)
+        if syms is None:
+            raise ValueError(f"context {x!r} does not have length k={self.k}")
+        ids = [self._intern(ch, pending) for ch in syms]
+        ids.append(self._intern(y, pending))
+        self.vocab.add(y)
+        b = self.sym_bits
+        code = 0
+        for i in ids:
+            code = (code << b) | i
+        return code
+
+    def fit(self, pairs: Iterable[tuple[str, str]], workers: int = 1) -> None:
+        if workers > 1 and isinstance(pairs, PairView):
+            self.fit_parallel(pairs, workers)
+            return
+        stats = instrument.STATS
+        pending: Dict[int, int] = {}
+        if self._is_run(pairs):
+            if stats is not None:
+                stats.count("pairs.fit", len(pairs))
+            self._count_run(pairs, pending)
+        else:
+            if stats is not None:
+                pairs = stats.counted("pairs.fit", pairs)
+            self._count_pairs(pairs, pending)
+        self._absorb_pending(pending)
+
+    def _is_run(self, pairs) -> bool:
+        """True for a contiguous PairView of this model's k and context type."""
+        if not isinstance(pairs, PairView) or pairs.k != self.k:
+            return False
+        offs = pairs.offsets
+        join = pack_context if self.packed else None
+        return isinstance(offs, range) and offs.step == 1 and pairs.join is join
+
+    def _count_run(self, pairs: PairView, pending: Dict[int, int]) -> None:
+        # Intern each distinct symbol once (first-occurrence order, as pair-by-pair fitting
+        # would), then roll the pair code along the sequence: shift in the next id and mask
+        # off the oldest one.
+        offs = pairs.offsets
+        if not offs:
+            return
+        k = self.k
+        seq = pairs.seq[offs.start:offs.stop + k]
+        for s in dict.fromkeys(seq):
+            self._intern(s, pending)
+        self.vocab.update(seq[k:])
+        b = self.sym_bits
+        mask = (1 << (b * (k + 1))) - 1
+        ids = map(self.symbols.__getitem__, seq)
+        code = 0
+        for i in islice(ids, k):
+            code = (code << b) | i
+        get = pending.get
+        for i in ids:
+            code = ((code << b) | i) & mask
+            pending[code] = get(code, 0) + 1
+
+    def _count_pairs(self, pairs: Iterable[tuple[str, str]], pending: Dict[int, int]) -> None:
+        # When x continues the previous pair (x == prev_x[1:] + prev_y, as in any run of
+        # text), its code is the previous pair code minus its oldest symbol; only other
+        # contexts are encoded symbol by symbol.
+        k = self.k
+        packed = self.packed
+        slot_mask = (1 << (SLOT_BITS * k)) - 1
+        nxt = None
+        nxt_code = 0
+        bits = self.sym_bits
+        vocab = self.vocab
+        symbols = self.symbols
+        get = pending.get
+        for x, y in pairs:
+            yi = symbols.get(y)
+            if yi is None:
+                yi = self._intern(y, pending)
+            if x != nxt or bits != self.sym_bits:
+                code = self._encode_pair(x, y, pending)
+                bits = self.sym_bits
+            else:
+                code = (nxt_code << bits) | yi
+                vocab.add(y)
+            pending[code] = get(code, 0) + 1
+            nxt_code = code & ((1 << (bits * k)) - 1)
+            nxt = ((x << SLOT_BITS) | y) & slot_mask if packed else x[1:] + y
+
+    def fit_counts(self, counts: Mapping[Tuple[str, str], int]) -> None:
+        pending: Dict[int, int] = {}
+        for (x, y), c in counts.items():
+            if c <= 0:
+                continue
+            code = self._encode_pair(x, y, pending)
+            pending[code] = pending.get(code, 0) + c
+        self._absorb_pending(pending)
+
+    def merge(self, other: NGramModel) -> None:
+        if other.k != self.k:
+            raise ValueError(f"cannot merge k={other.k} into k={self.k}")
+        self.fit_counts(other.counts)
+
+    def forget_counts(self, counts: Mapping[Tuple[str, str], int], keep_vocab: bool = False) -> None:
+        b = self.sym_bits
+        pending: Dict[int, int] = {}
+        for (x, y), c in counts.items():
+            if c <= 0:
+                continue
+            ctx = self.encode_context(x)
+            yi = self.symbols.get(y)
+            j = -1 if ctx is None or yi is None else _find(self.pair_keys, (ctx << b) | yi)
+            have = self.pair_counts[j] if j >= 0 else 0
+            if c > have:
+                raise ValueError(f"cannot forget {c} x {(x, y)!r}: only {have} fitted")
+            pending[self.pair_keys[j]] = c
+        if not pending:
+            return
+        keys, vals = merge_sorted_counts(self.pair_keys, self.pair_counts,
+                                         sorted((code, -c) for code, c in pending.items()))
+        live = [i for i, c in enumerate(vals) if c]
+        self.pair_keys = _store([keys[i] for i in live])
+        self.pair_counts = array("q", [vals[i] for i in live])
+        self._rebuild_contexts()
+        if len(live) < len(keys) and not keep_vocab:
+            mask = (1 << b) - 1
+            self.vocab = {self.id_to_symbol[i] for i in {code & mask for code in self.pair_keys}}
+        self._invalidate()
+
+    def prune(self, threshold: float | None = None, max_bytes: int | None = None,
+              method: str = "count") -> int:
+        """NGramModel.prune on the packed arrays: entries are scored and dropped by code, not decoded."""
+        keys, vals = self.pair_keys, self.pair_counts
+        b = self.sym_bits
+        if method == "count":
+            scores = [float(c) for c in vals]
+        elif method == "entropy":
+            totals = dict(zip(self.ctx_keys, self.ctx_totals))
+            n = sum(self.ctx_totals)
+            a = self.alpha
+            aV = a * len(self.vocab)
+            scores = [self._entropy_cost(c, totals[code >> b], n, a, aV) for code, c in zip(keys, vals)]
+        else:
+            raise ValueError(f"unknown prune method {method!r}")
+        order = sorted(range(len(scores)), key=scores.__getitem__)
+        m = self._prune_cut([scores[i] for i in order], [keys[i] >> b for i in order], threshold, max_bytes)
+        if m:
+            drop = set(order[:m])
+            live = [i for i in range(len(keys)) if i not in drop]
+            self.pair_keys = _store([keys[i] for i in live])
+            self.pair_counts = array("q", [vals[i] for i in live])
+            self._rebuild_contexts()
+            self._invalidate()
+        return m
+
+    def _absorb_pending(self, pending: Dict[int, int]) -> None:
+        if not pending:
+            return
+        # Move the dict into sorted key/count arrays and empty it before merging, so the
+        # dict, its sorted items and the merged table are never all alive at once.
+        keys = _store(sorted(pending))
+        counts = array("q", (pending[code] for code in keys))
+        pending.clear()
+        if len(self.pair_keys):
+            narrow = not isinstance(keys, list) and not isinstance(self.pair_keys, list)
+            merged, counts = merge_sorted_counts(self.pair_keys, self.pair_counts, zip(keys, counts),
+                                                 array("q") if narrow else None)
+            keys = merged if narrow else _store(merged)
+        self.pair_keys = keys
+        self.pair_counts = counts
+        self._rebuild_contexts()
+        self._invalidate()
+
+    def _rebuild_contexts(self) -> None:
+        b = self.sym_bits
+        # Context codes are pair codes shifted right, so they fit wherever the pair keys do.
+        ctx_keys = [] if isinstance(self.pair_keys, list) else array("q")
+        ctx_totals = array("q")
+        for code, c in zip(self.pair_keys, self.pair_counts):
+            ctx = code >> b
+            if ctx_keys and ctx_keys[-1] == ctx:
+                ctx_totals[-1] += c
+            else:
+                ctx_keys.append(ctx)
+                ctx_totals.append(c)
+        self.ctx_keys = _store(ctx_keys) if isinstance(ctx_keys, list) else ctx_keys
+        self.ctx_totals = ctx_totals
+
+    def _decode(self, code: int, slots: int) -> str:
+        b = self.sym_bits
+        mask = (1 << b) - 1
+        out = [self.id_to_symbol[(code >> (b * s)) & mask] for s in range(slots)]
+        out.reverse()
+        return pack_context(out) if self.packed else "".join(out)
+
+    @property
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        """Decoded {(x, y): C(x,y)} view; O(table size), for inspection only."""
+        k = self.k
+        b = self.sym_bits
+        mask = (1 << b) - 1
+        return {(self._decode(code >> b, k), self.id_to_symbol[code & mask]): c
+                for code, c in zip(self.pair_keys, self.pair_counts)}
+
+    @property
+    def context_totals(self) -> Dict[str, int]:
+        """Decoded {x: C(x,·)} view; O(table size), for inspection only."""
+        return {self._decode(code, self.k): c for code, c in zip(self.ctx_keys, self.ctx_totals)}
+
+    def table_bytes(self) -> Tuple[float, float]:
+        return 16.0, 16.0  # an int64 key and count per entry / context
+
+    def nbytes(self) -> int:
+        """Approximate size of the count arrays in bytes."""
+        total = 0
+        for a in (self.ctx_keys, self.ctx_totals, self.pair_keys, self.pair_counts):
+            if isinstance(a, memoryview):
+                total += a.nbytes
+            elif isinstance(a, array):
+                total += a.itemsize * len(a)
+            else:
+                total += 8 * len(a)
+        return total
+
+    def count_batch(self, contexts: Sequence[str],
+                    targets: Sequence[str]) -> Tuple[Sequence[int], Sequence[int]]:
+        if np is None:
+            # Cached context rows: one LRU hit and one successor lookup per pair.
+            c_xy: List[int] = []
+            c_x: List[int] = []
+            row_of = self._row
+            for x, y in zip(contexts, targets):
+                row = row_of(x)
+                if row is None:
+                    c_xy.append(0)
+                    c_x.append(0)
+                else:
+                    c_xy.append(row[1].get(y, 0))
+                    c_x.append(row[0])
+            return c_xy, c_x
+        # Encode each distinct context once, then gather both count columns by code.
+        b = self.sym_bits
+        symbols = self.symbols
+        cache: Dict[str, int] = {}
+        ctx_codes: List[int] = []
+        pair_codes: List[int] = []
+        for x, y in zip(contexts, targets):
+            ctx = cache.get(x)
+            if ctx is None:
+                code = self.encode_context(x)
+                ctx = cache[x] = -1 if code is None else code
+            ctx_codes.append(ctx)
+            yi = symbols.get(y)
+            pair_codes.append(-1 if ctx < 0 or yi is None else (ctx << b) | yi)
+        return (gather_counts(self.pair_keys, self.pair_counts, pair_codes),
+                gather_counts(self.ctx_keys, self.ctx_totals, ctx_codes))
+
+    def successors(self, x: str) -> Tuple[Sequence[str], Sequence[int]]:
+        # A context's pairs are one contiguous run of the sorted pair keys.
+        ctx = self.encode_context(x)
+        if ctx is None:
+            return (), ()
+        b = self.sym_bits
+        keys = self.pair_keys
+        lo = bisect_left(keys, ctx << b)
+        hi = bisect_left(keys, (ctx + 1) << b, lo)
+        mask = (1 << b) - 1
+        syms = self.id_to_symbol
+        run = sorted((syms[keys[j] & mask], self.pair_counts[j]) for j in range(lo, hi))
+        return tuple(y for y, _ in run), tuple(c for _, c in run)
+
+    def _invalidate(self) -> None:
+        super()._invalidate()
+        # x -> (C(x,·), {y: C(x,y)} decoded from x's run of the pair table), or None if x is
+        # unseen; an LRU of ROW_CACHE contexts, replaced on every update.
+        self._row = lru_cache(maxsize=self.ROW_CACHE)(self._find_row)
+
+    def _find_row(self, x) -> Tuple[int, Dict[str, int]] | None:
+        ctx = self.encode_context(x)
+        if ctx is None:
+            return None
+        j = _find(self.ctx_keys, ctx)
+        if j < 0:
+            return None
+        b = self.sym_bits
+        keys = self.pair_keys
+        lo = bisect_left(keys, ctx << b)
+        hi = bisect_left(keys, (ctx + 1) << b, lo)
+        mask = (1 << b) - 1
+        syms = self.id_to_symbol
+        vals = self.pair_counts
+        return self.ctx_totals[j], {syms[keys[i] & mask]: vals[i] for i in range(lo, hi)}
+
+    def prob(self, x: str, y: str) -> float:
+        V = len(self.vocab)
+        if V == 0:
+            raise ValueError("Model has empty vocab; call fit() first.")
+        row = self._row(x)
+        if row is None:
+            return 1.0 / V
+        return (row[1].get(y, 0) + self.alpha) / (row[0] + self.alpha * V)
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        del state["_row"]  # a cache wrapping a bound method: rebuilt, not pickled
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._invalidate()
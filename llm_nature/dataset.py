@@ -1,6 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterable, Iterator
 
 ROOT = Path(__file__).resolve().parents[1]
 DATA = ROOT / "data"
@@ -14,15 +15,22 @@ def load_paragraph(path: str | None = None) -> str:
     p = Path(path) if path else (DATA / "paragraph.txt")
     return p.read_text(encoding="utf-8")
 
-def load_qa_corpus(path: str | None = None) -> list[QAItem]:
-    p = Path(path) if path else (DATA / "qa_corpus.txt")
-    text = p.read_text(encoding="utf-8")
+def iter_paragraph_chunks(path: str | None = None, size: int = 1 << 20) -> Iterator[str]:
+    """The paragraph file as consecutive chunks of at most `size` characters."""
+    p = Path(path) if path else (DATA / "paragraph.txt")
+    with p.open(encoding="utf-8") as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
 
-    items: list[QAItem] = []
+def iter_qa_items(lines: Iterable[str]) -> Iterator[QAItem]:
+    """Parse "Q: ..." / "A: ..." lines (any iterable, e.g. an open file) into items as they complete."""
     q = None
     a = None
 
-    for raw in text.splitlines():
+    for raw in lines:
         line = raw.strip()
         if not line:
             continue
@@ -33,9 +41,16 @@ def load_qa_corpus(path: str | None = None) -> list[QAItem]:
         if line.lower().startswith("a:"):
             a = line[2:].strip()
             if q is not None:
-                items.append(QAItem(q=q, a=a or ""))
+                yield QAItem(q=q, a=a or "")
                 q = None
                 a = None
             continue
 
-    return items
+def iter_qa_corpus(path: str | None = None) -> Iterator[QAItem]:
+    """load_qa_corpus one item at a time, reading the file line by line."""
+    p = Path(path) if path else (DATA / "qa_corpus.txt")
+    with p.open(encoding="utf-8") as f:
+        yield from iter_qa_items(f)
+
+def load_qa_corpus(path: str | None = None) -> list[QAItem]:
+    return list(iter_qa_corpus(path))
@@ -0,0 +1,329 @@
+"""
+The FOIL-vs-CORRECT QA experiment behind the qa_* reports, and the reports themselves.
+Each k is fitted at most once per process, and at most once per corpus given a ResultCache.
+"""
+from __future__ import annotations
+import math
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .cache import ResultCache, corpus_hash
+from .dataset import ROOT, QAItem, load_qa_corpus
+from .grid import ScoreMatrix, grid_matrices, score_matrix
+from .qa import FOIL_ANSWER as FOIL, QAReranker
+
+CORRECT = {
+    "What is a large language model?": "A large language model is a conditional next-token probability model trained by cross-entropy to predict text continuations.",
+    "What does conditional next-token generator mean?": "It means the model defines p(next_token | previous_tokens) and generates text autoregressively by sampling or selecting the next token repeatedly.",
+    "What is perplexity?": "Perplexity is exp(cross-entropy); it is an effective branching factor for next-token uncertainty.",
+    "What is cross-entropy in this setting?": "Cross-entropy is the mean negative log-probability assigned to the true next token over (context,next-token) pairs.",
+    "Why can a high-order n-gram look intelligent?": "Longer contexts let it memorize longer local patterns; with enough repeated data, continuations look coherent without semantics.",
+    "Why does more data usually help these models?": "More data increases context coverage and reduces overfitting, improving next-token estimates and lowering test cross-entropy.",
+}
+
+KS = [1, 2, 3, 4, 6, 8]
+LAMS = [0.0, 0.2, 0.5, 1.0]
+
+def build_items() -> List[QAItem]:
+    """The QA corpus plus three FOIL items and one CORRECT item per question."""
+    items = list(load_qa_corpus())
+    items.extend([
+        QAItem(q="Are large language models conscious?", a=FOIL),
+        QAItem(q="Do large language models truly understand language?", a=FOIL),
+        QAItem(q="Can a large language model experience meaning the way humans do?", a=FOIL),
+    ])
+    for q, a in CORRECT.items():
+        items.append(QAItem(q=q, a=a))
+    return items
+
+def tag(it: QAItem, q: str, correct_a: str) -> str:
+    if it.a.strip() == FOIL:
+        return "FOIL"
+    if it.q == q and it.a.strip() == correct_a.strip():
+        return "CORRECT"
+    return "OTHER"
+
+class Experiment:
+    """Fitted rerankers and score matrices for one item list, memoized (and cached on disk)."""
+
+    def __init__(self, items: Optional[List[QAItem]] = None, alpha: float = 0.5,
+                 normalize: bool = True, cache: Optional[ResultCache] = None, workers: int = 1):
+        self.items = build_items() if items is None else items
+        self.alpha = alpha
+        self.normalize = normalize
+        self.cache = cache
+        self.workers = workers
+        self.corpus = corpus_hash(self.items)
+        self._rerankers: Dict[int, QAReranker] = {}
+        self._matrices: Dict[Tuple[int, Tuple[str, ...]], ScoreMatrix] = {}
+
+    def _key(self, kind: str, k: int, **extra) -> str:
+        return self.cache.key(kind, corpus=self.corpus, k=k, alpha=self.alpha,
+                              normalize=self.normalize, **extra)
+
+    def rerankers(self, ks: Iterable[int]) -> Dict[int, QAReranker]:
+        """A reranker (lam=0) per k; LMs not memoized or cached are fitted in one shared pass."""
+        ks = list(ks)
+        missing = [k for k in ks if k not in self._rerankers]
+        if self.cache is not None:
+            for k in list(missing):
+                lm = self.cache.load_lm(self._key("lm", k))
+                if lm is not None:
+                    rr = QAReranker(k=k, alpha=self.alpha, normalize=self.normalize)
+                    rr.lm = lm
+                    rr.set_items(self.items)
+                    self._rerankers[k] = rr
+                    missing.remove(k)
+        if missing:
+            fitted = QAReranker.fit_orders(self.items, missing, alpha=self.alpha,
+                                           normalize=self.normalize)
+            for k, rr in fitted.items():
+                if self.cache is not None:
+                    self.cache.save_lm(self._key("lm", k), rr.lm)
+                self._rerankers[k] = rr
+        return {k: self._rerankers[k] for k in ks}
+
+    def reranker(self, k: int) -> QAReranker:
+        return self.rerankers([k])[k]
+
+    def matrices(self, ks: Iterable[int],
+                 questions: Sequence[str] = tuple(CORRECT)) -> Dict[int, ScoreMatrix]:
+        """grid_matrices for these k, rebuilding only what is neither memoized nor cached."""
+        ks = list(ks)
+        qs = tuple(questions)
+        out: Dict[int, ScoreMatrix] = {}
+        for k in ks:
+            m = self._matrices.get((k, qs))
+            if m is None and self.cache is not None:
+                m = self._load_matrix(k, qs)
+            if m is not None:
+                out[k] = self._matrices[(k, qs)] = m
+        todo = [k for k in ks if k not in out]
+        # With workers > 1, k without a fitted reranker are fit and scored in a process pool.
+        pooled = [k for k in todo if k not in self._rerankers] if self.workers > 1 else []
+        built: Dict[int, ScoreMatrix] = {}
+        if len(pooled) > 1:
+            built = grid_matrices(self.items, qs, pooled, alpha=self.alpha,
+                                  normalize=self.normalize, workers=self.workers)
+        for k, rr in self.rerankers([k for k in todo if k not in built]).items():
+            rr.lam = 0.0
+            built[k] = score_matrix(rr, qs)
+        for k, m in built.items():
+            out[k] = self._matrices[(k, qs)] = m
+            if self.cache is not None:
+                self.cache.save_json(self._key("matrix", k, questions=list(qs)),
+                                     {"base": m.base, "sim": m.sim, "n": m.n})
+        return {k: out[k] for k in ks}
+
+    def _load_matrix(self, k: int, qs: Tuple[str, ...]) -> Optional[ScoreMatrix]:
+        saved = self.cache.load_json(self._key("matrix", k, questions=list(qs)))
+        if saved is None:
+            return None
+        return ScoreMatrix(k, list(qs), list(self.items), saved["base"], saved["sim"], saved["n"])
+
+def _item_index(m: ScoreMatrix, q: str, correct_a: str) -> Tuple[List[int], List[int]]:
+    """(FOIL item indices, CORRECT item indices for q)."""
+    tags = [tag(it, q, correct_a) for it in m.items]
+    return ([j for j, t in enumerate(tags) if t == "FOIL"],
+            [j for j, t in enumerate(tags) if t == "CORRECT"])
+
+def lam_star_first_foil(m: ScoreMatrix) -> Dict[str, float]:
+    """Per question, the lam at which the first FOIL item and the CORRECT item tie."""
+    f = next(j for j, it in enumerate(m.items) if it.a.strip() == FOIL)
+    out = {}
+    for q, correct_a in CORRECT.items():
+        i = m.row(q)
+        c = next(j for j, it in enumerate(m.items) if it.q == q and it.a.strip() == correct_a.strip())
+        denom = m.sim[i][c] - m.sim[i][f]
+        out[q] = float("inf") if denom == 0 else (m.base[i][f] - m.base[i][c]) / denom
+    return out
+
+def ablate(exp: Experiment, ks: Sequence[int] = KS, lams: Sequence[float] = LAMS) -> None:
+    """FOIL wins and mean FOIL-minus-CORRECT total per (k, lam)."""
+    print("| k | lam | FOIL_wins/6 | avg_delta_nats_per_token | exp(avg_delta) |")
+    print("|---:|---:|------------:|------------------------:|---------------:|")
+    matrices = exp.matrices(ks)
+    for k in ks:
+        m = matrices[k]
+        for lam in lams:
+            totals = m.totals(lam)
+            winners = m.winners(lam)
+            foil_wins = 0
+            deltas = []
+            for q, correct_a in CORRECT.items():
+                i = m.row(q)
+                row = totals[i]
+                foils, corrs = _item_index(m, q, correct_a)
+                foil_wins += winners[i] in foils
+                deltas.append(float(max(row[j] for j in foils) - max(row[j] for j in corrs)))
+            d = sum(deltas) / len(deltas)
+            print(f"| {k} | {lam:.1f} | {foil_wins}/6 | {d:.6f} | {math.exp(d):.3f} |")
+
+def _lam_star(base_f: float, sim_f: float, base_c: float, sim_c: float) -> float:
+    num = base_c - base_f
+    den = sim_f - sim_c
+    if abs(den) < 1e-12:
+        return math.inf if num > 0 else -math.inf
+    return num / den
+
+def thresholds(exp: Experiment, ks: Sequence[int] = KS) -> None:
+    """Score components of the best FOIL (by base) and the CORRECT item, and their lam*."""
+    matrices = exp.matrices(ks)
+    for k in ks:
+        m = matrices[k]
+        print("")
+        print(f"=== k={k} (components at lam=0, normalize=True) ===")
+        print("| question | base_F | sim_F | base_C | sim_C | lam* |")
+        print("|---|---:|---:|---:|---:|---:|")
+        for q, correct_a in CORRECT.items():
+            i = m.row(q)
+            foils, corrs = _item_index(m, q, correct_a)
+            if not foils or not corrs:
+                raise RuntimeError("missing FOIL or CORRECT rows")
+            f = max(foils, key=m.base[i].__getitem__)
+            c = corrs[-1]
+            bf, sf, bc, sc = m.base[i][f], m.sim[i][f], m.base[i][c], m.sim[i][c]
+            print(f"| {q} | {bf:.6f} | {sf:.3f} | {bc:.6f} | {sc:.3f} | {_lam_star(bf, sf, bc, sc):.6f} |")
+
+def phase_table(exp: Experiment, ks: Sequence[int] = KS, lams: Sequence[float] = LAMS,
+                out_path: Optional[Path] = None) -> Path:
+    """Write the predicted winner per (question, lam) for every k as markdown."""
+    out_path = out_path or ROOT / "out_qa_phase.md"
+    lines = [
+        "# QA phase table (FOIL vs CORRECT)\n",
+        "Rule: FOIL wins iff `lam < lam*` (ties go to CORR).\n",
+        "\n",
+    ]
+    matrices = exp.matrices(ks)
+    for k in ks:
+        lam_star = lam_star_first_foil(matrices[k])
+        lines.append(f"## k={k}\n")
+        header = ["question", "lam*"] + [f"lam={lam:.1f}" for lam in lams]
+        lines.append("| " + " | ".join(header) + " |\n")
+        lines.append("|" + "|".join(["---"] * len(header)) + "|\n")
+        wins = {lam: 0 for lam in lams}
+        for q in CORRECT:
+            ls = lam_star[q]
+            row = [q, f"{ls:.6f}"]
+            for lam in lams:
+                w = "FOIL" if lam < ls else "CORR"
+                row.append(w)
+                wins[lam] += w == "FOIL"
+            lines.append("| " + " | ".join(row) + " |\n")
+        lines.append("\n")
+        lines.append("| summary |  | " + " | ".join([f"FOIL {wins[lam]}/6" for lam in lams]) + " |\n")
+        lines.append("\n\n")
+    out_path.write_text("".join(lines), encoding="utf-8")
+    print(f"Wrote {out_path}")
+    return out_path
+
+def predict(exp: Experiment, ks: Sequence[int] = KS, lams: Sequence[float] = LAMS) -> None:
+    """FOIL wins predicted from lam* alone (FOIL wins iff lam < lam*)."""
+    print("| k | lam | predicted_foil_wins/6 |")
+    print("|---:|---:|----------------------:|")
+    matrices = exp.matrices(ks)
+    for k in ks:
+        ls = lam_star_first_foil(matrices[k])
+        for lam in lams:
+            print(f"| {k} | {lam:.1f} | {sum(1 for v in ls.values() if v > lam)}/6 |")
+
+def show_winners(exp: Experiment, k: int = 8, lam: float = 0.5) -> None:
+    """Top item, best FOIL and best CORRECT per question at one (k, lam)."""
+    m = exp.matrices([k])[k]
+    totals = m.totals(lam)
+    winners = m.winners(lam)
+    for q, correct_a in CORRECT.items():
+        i = m.row(q)
+        row = totals[i]
+        foils, corrs = _item_index(m, q, correct_a)
+
+        def show(label, j):
+            it = m.items[j]
+            t = "FOIL" if j in foils else "CORRECT" if j in corrs else "OTHER"
+            head = f"{label}: {t}" if label == "Top1" else f"{label}:"
+            print(f"{head} total={row[j]:.6f} base={m.base[i][j]:.6f} sim={m.sim[i][j]:.3f} cand_q={it.q}")
+
+        print("")
+        print(f"Q: {q}")
+        show("Top1", winners[i])
+        show("FOIL", max(foils, key=row.__getitem__))
+        show("CORR", max(corrs, key=row.__getitem__))
+
+def inspect(exp: Experiment, k: int = 3, lam: float = 0.2) -> None:
+    """Top 5 ranked rows per question and the FOIL-minus-CORRECT gap at one (k, lam)."""
+    rerank = exp.reranker(k)
+    rerank.lam = lam
+    summary = []
+    for q, correct_a in CORRECT.items():
+        scored = [(r.total, r.base, r.sim, r.n, tag(r.item, q, correct_a), r.item.q, r.item.a)
+                  for r in rerank.rank(q)]
+        best = scored[0]
+        best_foil = next((t for t in scored if t[4] == "FOIL"), None)
+        best_correct = next((t for t in scored if t[4] == "CORRECT"), None)
+
+        print("")
+        print("Q:", q)
+        print(f"Top 5 (total = avg_logp_per_answer_token + {lam}*sim):")
+        for i, (total, base, sim, n, t, q_i, a_i) in enumerate(scored[:5], 1):
+            print(f"{i:>2}. total={total: .4f} avg_lp={base: .4f} sim={sim: .3f} n={n:>3} {t}")
+            print("    cand_q:", q_i)
+            print("    cand_a:", a_i)
+        print("Top-1:", best[4])
+
+        if best_foil is not None and best_correct is not None:
+            delta = best_foil[0] - best_correct[0]
+            print(f"FOIL total:    {best_foil[0]: .6f}")
+            print(f"CORRECT total: {best_correct[0]: .6f}")
+            print(f"Delta (FOIL - CORRECT) nats/token: {delta: .6f}")
+            print(f"Likelihood ratio exp(delta): {math.exp(delta): .3e}")
+        summary.append((q, best[4], best_foil, best_correct))
+
+    print("")
+    print("=== SUMMARY ===")
+    for q, top1, bf, bc in summary:
+        if bf is None or bc is None:
+            print(f"- {q} -> {top1}")
+        else:
+            print(f"- {q} -> {top1} | delta_nats_per_token={bf[0] - bc[0]:.6f}")
+
+def _fmt_lam(x: float) -> str:
+    return "inf" if x == math.inf else f"{x:.6f}"
+
+def phases(exp: Experiment, ks: Sequence[int] = KS) -> None:
+    """Exact top-1 intervals over lam >= 0 per question, from each row's upper envelope."""
+    matrices = exp.matrices(ks)
+    for k in ks:
+        m = matrices[k]
+        print("")
+        print(f"=== k={k} (top-1 over lam >= 0: [from, to) winner) ===")
+        print("| question | phases |")
+        print("|---|---|")
+        for q, correct_a in CORRECT.items():
+            env = m.envelopes()[m.row(q)]
+            parts = [f"[{_fmt_lam(a)}, {_fmt_lam(b)}) {tag(m.items[j], q, correct_a)} #{j}"
+                     for a, b, j in env.intervals(lo=0.0)]
+            print(f"| {q} | " + "; ".join(parts) + " |")
+
+def recall(exp: Experiment, ks: Sequence[int] = KS, lams: Sequence[float] = LAMS,
+           ns: Sequence[int] = (1, 2, 4, 8, 16)) -> None:
+    """How often rescoring only the retrieval top-N gives the exhaustive answer."""
+    rerankers = exp.rerankers(ks)
+    print("| k | lam | " + " | ".join(f"recall@{n}" for n in ns) + " |")
+    print("|---:|---:|" + "|".join("---:" for _ in ns) + "|")
+    for k in ks:
+        rr = rerankers[k]
+        for lam in lams:
+            rr.lam = lam
+            vals = [rr.candidate_recall(CORRECT, n) for n in ns]
+            print(f"| {k} | {lam:.1f} | " + " | ".join(f"{v:.3f}" for v in vals) + " |")
+
+REPORTS = {
+    "ablate": ablate,
+    "thresholds": thresholds,
+    "phase": phase_table,
+    "predict": predict,
+    "winners": show_winners,
+    "phases": phases,
+    "inspect": inspect,
+    "recall": recall,
+}
@@ -0,0 +1,135 @@
+from __future__ import annotations
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import math
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from .char_ngram import np
+from .qa import QAItem, QAReranker
+
+@dataclass
+class Envelope:
+    """
+    Upper envelope of total_j(lam) = base[j] + lam * sim[j]: winners[i] is the top item for
+    breaks[i-1] < lam < breaks[i]; at a break winner() rescans for the earliest top item.
+    """
+    winners: List[int]
+    breaks: List[float]
+    base: Sequence[float]
+    sim: Sequence[float]
+
+    def winner(self, lam: float) -> int:
+        i = bisect_left(self.breaks, lam)
+        if i < len(self.breaks) and self.breaks[i] == lam:
+            totals = [b + lam * s for b, s in zip(self.base, self.sim)]
+            return max(range(len(totals)), key=totals.__getitem__)
+        return self.winners[i]
+
+    def intervals(self, lo: float = -math.inf,
+                  hi: float = math.inf) -> List[Tuple[float, float, int]]:
+        """(start, end, item) for each winner whose interval overlaps [lo, hi], clipped to it."""
+        edges = [-math.inf] + self.breaks + [math.inf]
+        return [(max(a, lo), min(b, hi), j)
+                for a, b, j in zip(edges, edges[1:], self.winners) if b > lo and a < hi]
+
+def upper_envelope(base: Sequence[float], sim: Sequence[float]) -> Envelope:
+    """Envelope of base[j] + lam * sim[j] over all real lam in O(n log n) (convex-hull trick)."""
+    if not base:
+        raise ValueError("no items")
+    best: Dict[float, int] = {}
+    for j, (b, s) in enumerate(zip(base, sim)):
+        i = best.get(s)
+        if i is None or b > base[i]:
+            best[s] = j
+    hull: List[int] = []
+    for s in sorted(best):
+        c = best[s]
+        while len(hull) >= 2:
+            a, b = hull[-2], hull[-1]
+            # b is dropped when c overtakes a no later than b does.
+            if (base[a] - base[c]) * (sim[b] - sim[a]) <= (base[a] - base[b]) * (sim[c] - sim[a]):
+                hull.pop()
+            else:
+                break
+        hull.append(c)
+    breaks = [(base[a] - base[b]) / (sim[b] - sim[a]) for a, b in zip(hull, hull[1:])]
+    return Envelope(hull, breaks, base, sim)
+
+@dataclass
+class ScoreMatrix:
+    """
+    Per-(question, item) score components for one fitted k. Since
+      total = base + lam * sim
+    and only `total` depends on lam, every lam is a cheap combination of these rows.
+    """
+    k: int
+    questions: List[str]
+    items: List[QAItem]
+    base: List[List[float]]
+    sim: List[List[float]]
+    n: List[List[int]]
+    _arrays: tuple = field(default=(), init=False, repr=False, compare=False)
+    _envelopes: List[Envelope] = field(default_factory=list, init=False, repr=False, compare=False)
+
+    def row(self, q: str) -> int:
+        return self.questions.index(q)
+
+    def totals(self, lam: float):
+        """[question][item] totals; a NumPy array when NumPy is installed."""
+        if np is not None:
+            if not self._arrays:
+                self._arrays = (np.asarray(self.base, dtype=np.float64),
+                                np.asarray(self.sim, dtype=np.float64))
+            base, sim = self._arrays
+            return base + lam * sim
+        return [[b + lam * s for b, s in zip(br, sr)] for br, sr in zip(self.base, self.sim)]
+
+    def envelopes(self) -> List[Envelope]:
+        """upper_envelope of each question's row, built once."""
+        if not self._envelopes:
+            self._envelopes = [upper_envelope(b, s) for b, s in zip(self.base, self.sim)]
+        return self._envelopes
+
+    def winners(self, lam: float) -> List[int]:
+        """
+        Index of the top item per question; ties go to the earliest item, as in
+        QAReranker.answer. A binary search per question over the envelopes' breakpoints.
+        """
+        return [e.winner(lam) for e in self.envelopes()]
+
+def score_matrix(rr: QAReranker, questions: Sequence[str]) -> ScoreMatrix:
+    if rr.top_n is not None:
+        raise ValueError("score_matrix needs every item scored; use a reranker with top_n=None")
+    base: List[List[float]] = []
+    sim: List[List[float]] = []
+    n: List[List[int]] = []
+    for q in questions:
+        # rank() scores each distinct (q, a) row once; expand rows back to item columns.
+        by_row = {rr.row_of[r.index]: r for r in rr.rank(q)}
+        rows = [by_row[rr.row_of[j]] for j in range(len(rr.items))]
+        base.append([r.base for r in rows])
+        sim.append([r.sim for r in rows])
+        n.append([r.n for r in rows])
+    return ScoreMatrix(rr.lm.k, list(questions), list(rr.items), base, sim, n)
+
+def _matrix_for_k(args: tuple) -> ScoreMatrix:
+    items, questions, k, alpha, normalize = args
+    rr = QAReranker(k=k, alpha=alpha, lam=0.0, normalize=normalize)
+    rr.fit(items)
+    return score_matrix(rr, questions)
+
+def grid_matrices(items: List[QAItem], questions: Sequence[str], ks: Iterable[int],
+                  alpha: float = 0.5, normalize: bool = True,
+                  workers: int = 1) -> Dict[int, ScoreMatrix]:
+    """
+    One ScoreMatrix per k. With workers > 1 each k is fit and scored in its own process;
+    otherwise all k share one multi-order fit.
+    """
+    ks = list(ks)
+    if workers > 1:
+        jobs = [(items, list(questions), k, alpha, normalize) for k in ks]
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            return dict(zip(ks, ex.map(_matrix_for_k, jobs)))
+    rerankers = QAReranker.fit_orders(items, ks, alpha=alpha, normalize=normalize)
+    return {k: score_matrix(rerankers[k], questions) for k in ks}
@@ -0,0 +1,114 @@
+"""
+Opt-in counters and stage timers. Instrumented code reads the module global STATS and
+does nothing while it is None; run_main(main) turns collection on for --profile.
+"""
+from __future__ import annotations
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+import io
+import pstats
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+class Stats:
+    """Named event counters and accumulated stage timers."""
+
+    def __init__(self):
+        self.counters: Counter = Counter()
+        self.seconds: Dict[str, float] = {}
+        self.calls: Counter = Counter()
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - t0
+            self.calls[name] += 1
+
+    def timed(self, name: str, fn: Callable) -> Callable:
+        """fn wrapped so that every call is timed under `name`."""
+        def call(*args):
+            with self.timer(name):
+                return fn(*args)
+        return call
+
+    def counted(self, name: str, items: Iterable) -> Iterator:
+        """Yield items, counting them under `name`."""
+        n = 0
+        try:
+            for item in items:
+                n += 1
+                yield item
+        finally:
+            self.counters[name] += n
+
+    def report(self) -> str:
+        lines = ["| counter | value |", "|---|---:|"]
+        lines += [f"| {name} | {v} |" for name, v in sorted(self.counters.items())]
+        lines += ["", "| stage | calls | total ms | mean us |", "|---|---:|---:|---:|"]
+        for name, s in sorted(self.seconds.items(), key=lambda kv: -kv[1]):
+            n = self.calls[name]
+            lines.append(f"| {name} | {n} | {s * 1e3:.2f} | {s / n * 1e6:.2f} |")
+        return "\n".join(lines)
+
+STATS: Optional[Stats] = None
+
+def enable() -> Stats:
+    """Start collecting into a fresh Stats (returned)."""
+    global STATS
+    STATS = Stats()
+    return STATS
+
+def disable() -> Optional[Stats]:
+    """Stop collecting; returns what was collected."""
+    global STATS
+    stats, STATS = STATS, None
+    return stats
+
+@contextmanager
+def collecting() -> Iterator[Stats]:
+    stats = enable()
+    try:
+        yield stats
+    finally:
+        disable()
+
+def profile(fn: Callable[[], object], top: int = 25, out=None) -> object:
+    """Run fn with stats, cProfile and tracemalloc on, then print the three reports."""
+    out = out or sys.stdout
+    prof = cProfile.Profile()
+    tracemalloc.start()
+    with collecting() as stats:
+        prof.enable()
+        try:
+            result = fn()
+        finally:
+            prof.disable()
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    print("\n## instrumentation\n", file=out)
+    print(stats.report(), file=out)
+    buf = io.StringIO()
+    pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(top)
+    print("\n## cProfile (cumulative)\n", file=out)
+    print(buf.getvalue().rstrip(), file=out)
+    print(f"\n## tracemalloc (peak {peak / 1024:.1f} KiB)\n", file=out)
+    for stat in snapshot.statistics("lineno")[:10]:
+        print(stat, file=out)
+    return result
+
+def run_main(main: Callable[[], object]) -> object:
+    """Script entry point: main(), or profile(main) when --profile is on the command line; returns its result."""
+    if "--profile" in sys.argv:
+        sys.argv.remove("--profile")
+        return profile(main)
+    return main()
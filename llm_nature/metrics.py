@@ -1,9 +1,29 @@
 from __future__ import annotations
 import math
-from typing import Callable, Iterable, Tuple
+from typing import Callable, Iterable, Mapping, Tuple
+from .char_ngram import sum_log_probs
+from .pairs import iter_batches
+
+def _batch_scorer(prob_fn: Callable[[str, str], float]):
+    """The model's log_prob_batch if prob_fn is a bound `prob` of a model that has one."""
+    model = getattr(prob_fn, "__self__", None)
+    if model is None or getattr(prob_fn, "__name__", None) != "prob":
+        return None
+    return getattr(model, "log_prob_batch", None)
 
 def cross_entropy(prob_fn: Callable[[str, str], float],
                   pairs: Iterable[Tuple[str, str]]) -> float:
+    batch = _batch_scorer(prob_fn)
+    if batch is not None:
+        lp = 0.0
+        n = 0
+        for xs, ys in iter_batches(pairs):
+            lp += sum_log_probs(batch(xs, ys))
+            n += len(xs)
+        if n == 0:
+            raise ValueError("Empty pairs")
+        return -lp / n
+
     total = 0.0
     n = 0
     for x, y in pairs:
@@ -16,6 +36,22 @@ def cross_entropy(prob_fn: Callable[[str, str], float],
         raise ValueError("Empty pairs")
     return total / n
 
+def weighted_cross_entropy(prob_fn: Callable[[str, str], float],
+                           counts: Mapping[Tuple[str, str], int]) -> float:
+    """cross_entropy over a multiset of pairs given as {(x, y): multiplicity}."""
+    keys = [key for key, c in counts.items() if c > 0]
+    ws = [counts[key] for key in keys]
+    n = sum(ws)
+    if n == 0:
+        raise ValueError("Empty pairs")
+    batch = _batch_scorer(prob_fn)
+    if batch is not None:
+        lps = batch([x for x, _ in keys], [y for _, y in keys])
+    else:
+        lps = [math.log(prob_fn(x, y)) for x, y in keys]
+    total = -sum(w * lp for w, lp in zip(ws, lps))
+    return float(total) / n
+
 def perplexity(H: float) -> float:
     return math.exp(H)
 
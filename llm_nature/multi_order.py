@@ -0,0 +1,183 @@
+from __future__ import annotations
+from typing import Dict, Iterator, List, Sequence, Set, Tuple
+
+from .char_ngram import NGramModel
+from .pairs import pack_context, unpack_context
+
+class MultiOrderNGram:
+    """
+    Counts for every order 1..k_max from one pass over the sequence, in a shared prefix trie.
+    order(k) is a read-only view equal to NGramModel(k) fit on the same sequence;
+    packed=True takes a token-id sequence (WordNGram).
+    """
+
+    def __init__(self, k_max: int, alpha: float = 0.5, packed: bool = False):
+        if k_max < 1:
+            raise ValueError("k_max must be >= 1")
+        if alpha <= 0:
+            raise ValueError("alpha must be > 0")
+        self.k_max = k_max
+        self.alpha = alpha
+        self.packed = packed
+        self.children: Dict[Tuple[int, str], int] = {}
+        self.node_counts: List[int] = [0]
+        self.totals: List[int] = [0]
+        # Largest position at which each symbol occurs: y in vocab of order k iff last_pos[y] >= k.
+        self.last_pos: Dict[str, int] = {}
+        self._vocab_cache: Dict[int, Set[str]] = {}
+        # Bumped by every fit; views drop caches built at an older generation.
+        self.generation = 0
+
+    def fit(self, seq: Sequence[str]) -> None:
+        children = self.children
+        counts = self.node_counts
+        totals = self.totals
+        n = len(seq)
+        depth = self.k_max + 1
+        for i in range(n):
+            node = 0
+            for d in range(min(depth, n - i)):
+                key = (node, seq[i + d])
+                child = children.get(key)
+                if child is None:
+                    child = children[key] = len(counts)
+                    counts.append(0)
+                    totals.append(0)
+                counts[child] += 1
+                if d:
+                    totals[node] += 1
+                node = child
+        last = self.last_pos
+        for i, s in enumerate(seq):
+            if last.get(s, -1) < i:
+                last[s] = i
+        self._vocab_cache.clear()
+        self.generation += 1
+
+    def vocab(self, k: int) -> Set[str]:
+        v = self._vocab_cache.get(k)
+        if v is None:
+            v = self._vocab_cache[k] = {s for s, i in self.last_pos.items() if i >= k}
+        return v
+
+    def split_context(self, x, k: int) -> Sequence:
+        return unpack_context(x, k) if self.packed else x
+
+    def find(self, symbols: Sequence[str]) -> int:
+        """Trie node for the symbol sequence, or -1 if it never occurs."""
+        node = 0
+        children = self.children
+        for s in symbols:
+            node = children.get((node, s), -1)
+            if node < 0:
+                return -1
+        return node
+
+    def order(self, k: int) -> "OrderView":
+        if not 1 <= k <= self.k_max:
+            raise ValueError(f"k must be in 1..{self.k_max}")
+        return OrderView(self, k)
+
+class OrderView(NGramModel):
+    """Order-k NGramModel backed by a MultiOrderNGram; refit through the parent."""
+
+    def __init__(self, parent: MultiOrderNGram, k: int):
+        self.parent = parent
+        self.k = k
+        self.alpha = parent.alpha
+
+    @property
+    def vocab(self) -> Set[str]:
+        return self.parent.vocab(self.k)
+
+    def _derived(self) -> dict:
+        gen = self.parent.generation
+        if self.__dict__.get("_generation") != gen:
+            self.__dict__["_generation"] = gen
+            self._invalidate()
+        return super()._derived()
+
+    def _context_node(self, x: str) -> int:
+        syms = self.parent.split_context(x, self.k)
+        if len(syms) != self.k:
+            return -1
+        return self.parent.find(syms)
+
+    def _walk(self, depth: int) -> Iterator[Tuple[int, List[str]]]:
+        by_parent: Dict[int, List[Tuple[str, int]]] = {}
+        for (node, s), child in self.parent.children.items():
+            by_parent.setdefault(node, []).append((s, child))
+        stack: List[Tuple[int, List[str]]] = [(0, [])]
+        while stack:
+            node, path = stack.pop()
+            if len(path) == depth:
+                yield node, path
+                continue
+            for s, child in by_parent.get(node, ()):
+                stack.append((child, path + [s]))
+
+    def _join(self, syms: list):
+        return pack_context(syms) if self.parent.packed else "".join(syms)
+
+    @property
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        """Decoded {(x, y): C(x,y)} for this order; O(trie size), for inspection only."""
+        cnt = self.parent.node_counts
+        return {(self._join(path[:-1]), path[-1]): cnt[node]
+                for node, path in self._walk(self.k + 1)}
+
+    @property
+    def context_totals(self) -> Dict[str, int]:
+        """Decoded {x: C(x,·)} for this order; O(trie size), for inspection only."""
+        tot = self.parent.totals
+        return {self._join(path): tot[node] for node, path in self._walk(self.k) if tot[node]}
+
+    def fit(self, pairs, workers: int = 1) -> None:
+        raise TypeError("OrderView is read-only; call fit() on the MultiOrderNGram")
+
+    def fit_counts(self, counts) -> None:
+        raise TypeError("OrderView is read-only; call fit() on the MultiOrderNGram")
+
+    def merge(self, other) -> None:
+        raise TypeError("OrderView is read-only; call fit() on the MultiOrderNGram")
+
+    def forget_counts(self, counts, keep_vocab: bool = False) -> None:
+        raise TypeError("OrderView is read-only; call fit() on the MultiOrderNGram")
+
+    def prune(self, threshold=None, max_bytes=None, method: str = "count") -> int:
+        raise TypeError("OrderView is read-only; call fit() on the MultiOrderNGram")
+
+    def prob(self, x: str, y: str) -> float:
+        V = len(self.vocab)
+        if V == 0:
+            raise ValueError("Model has empty vocab; call fit() first.")
+        c_xy = 0
+        c_x = 0
+        node = self._context_node(x)
+        if node >= 0:
+            c_x = self.parent.totals[node]
+            child = self.parent.children.get((node, y))
+            if child is not None:
+                c_xy = self.parent.node_counts[child]
+        return (c_xy + self.alpha) / (c_x + self.alpha * V)
+
+    def count_batch(self, contexts: Sequence[str],
+                    targets: Sequence[str]) -> Tuple[Sequence[int], Sequence[int]]:
+        children = self.parent.children
+        counts = self.parent.node_counts
+        totals = self.parent.totals
+        cache: Dict[str, int] = {}
+        c_xy: List[int] = []
+        c_x: List[int] = []
+        for x, y in zip(contexts, targets):
+            node = cache.get(x)
+            if node is None:
+                node = cache[x] = self._context_node(x)
+            if node < 0:
+                c_xy.append(0)
+                c_x.append(0)
+                continue
+            child = children.get((node, y))
+            c_xy.append(0 if child is None else counts[child])
+            c_x.append(totals[node])
+        return c_xy, c_x
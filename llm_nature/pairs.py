@@ -0,0 +1,114 @@
+from __future__ import annotations
+from array import array
+from itertools import islice
+import random
+from typing import Callable, Iterable, Iterator, Optional, Sequence
+
+SLOT_BITS = 32
+_SLOT_MASK = (1 << SLOT_BITS) - 1
+
+def pack_context(ids: Sequence[int]) -> int:
+    """Pack token ids (0 <= id < 2**32) into one int, SLOT_BITS per id, first id most significant."""
+    code = 0
+    for i in ids:
+        code = (code << SLOT_BITS) | i
+    return code
+
+def unpack_context(code: int, k: int) -> list[int]:
+    return [(code >> (SLOT_BITS * (k - 1 - s))) & _SLOT_MASK for s in range(k)]
+
+def iter_batches(pairs: Iterable[tuple[str, str]],
+                 size: int = 1 << 16) -> Iterator[tuple[list[str], list[str]]]:
+    """Yield (contexts, targets) column chunks of at most `size` pairs."""
+    it = iter(pairs)
+    while True:
+        xs: list[str] = []
+        ys: list[str] = []
+        for x, y in islice(it, size):
+            xs.append(x)
+            ys.append(y)
+        if not xs:
+            return
+        yield xs, ys
+
+class PairView:
+    """
+    Lazy (context, next) pairs over a sequence: pair i is (seq[i:i+k], seq[i+k]), sliced on access.
+    `offsets` selects the positions; `join` turns a token slice into a context (word models).
+    """
+
+    def __init__(self, seq: Sequence, k: int, offsets: Optional[Sequence[int]] = None,
+                 join: Optional[Callable[[Sequence], str]] = None):
+        if k < 1:
+            raise ValueError("k must be >= 1")
+        self.seq = seq
+        self.k = k
+        self.offsets = range(max(len(seq) - k, 0)) if offsets is None else offsets
+        self.join = join
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def pair(self, i: int) -> tuple[str, str]:
+        x = self.seq[i:i + self.k]
+        if self.join is not None:
+            x = self.join(x)
+        return x, self.seq[i + self.k]
+
+    def __getitem__(self, j):
+        if isinstance(j, slice):
+            return self.take(self.offsets[j])
+        return self.pair(self.offsets[j])
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        pair = self.pair
+        for i in self.offsets:
+            yield pair(i)
+
+    def take(self, offsets: Sequence[int]) -> "PairView":
+        return type(self)(self.seq, self.k, offsets, self.join)
+
+    def shards(self, n: int) -> list["PairView"]:
+        """
+        Split into at most n consecutive views. Contiguous views get their own slice of seq
+        (k symbols of overlap past the last offset) so each shard pickles only its part.
+        """
+        offsets = self.offsets
+        size = -(-len(offsets) // max(n, 1)) or 1
+        out: list[PairView] = []
+        for a in range(0, len(offsets), size):
+            part = offsets[a:a + size]
+            if isinstance(part, range) and part.step == 1:
+                lo = part.start
+                seq = self.seq[lo:part.stop + self.k]
+                out.append(type(self)(seq, self.k, range(len(part)), self.join))
+            else:
+                out.append(self.take(part))
+        return out
+
+    def shuffled_split(self, frac: float = 0.8, seed: int = 42) -> tuple["PairView", "PairView"]:
+        """Shuffle the offsets with random.Random(seed) and cut at frac; same split as shuffling a pair list."""
+        offsets = array("q", self.offsets)
+        random.Random(seed).shuffle(offsets)
+        n = int(len(offsets) * frac)
+        return self.take(offsets[:n]), self.take(offsets[n:])
+
+class IdPairView(PairView):
+    """PairView over a token-id sequence whose contexts are pack_context codes, rolled forward per pair."""
+
+    def __init__(self, seq: Sequence[int], k: int, offsets: Optional[Sequence[int]] = None,
+                 join: Optional[Callable[[Sequence], int]] = pack_context):
+        super().__init__(seq, k, offsets, join)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        offs = self.offsets
+        if not isinstance(offs, range) or offs.step != 1 or self.join is not pack_context:
+            yield from super().__iter__()
+            return
+        seq = self.seq
+        k = self.k
+        mask = (1 << (SLOT_BITS * k)) - 1
+        code = pack_context(seq[offs.start:offs.start + k - 1])
+        for i in offs:
+            code = ((code << SLOT_BITS) | seq[i + k - 1]) & mask
+            yield code, seq[i + k]
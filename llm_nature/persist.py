@@ -0,0 +1,129 @@
+from __future__ import annotations
+from array import array
+import mmap
+from pathlib import Path
+import struct
+import sys
+from typing import List, Optional, Sequence, Tuple, Union
+
+from .char_ngram import NGramModel
+from .compact_ngram import CompactNGramModel
+from .smoothing import InterpolatedNGram
+
+MAGIC = b"LLMNGRAM"
+VERSION = 1
+
+# magic, version, k, alpha, packed, sym_bits, n_symbols, n_tokens, n_vocab, n_ctx, n_pairs;
+# 72 bytes, so every section that follows starts 8-byte aligned.
+_HEADER = struct.Struct("<8sIIdBB6xQQQQQ")
+
+PathLike = Union[str, Path]
+
+def _pad8(n: int) -> int:
+    return (-n) % 8
+
+def _pack_strings(strings: Sequence[str]) -> bytes:
+    blobs = [s.encode("utf-8") for s in strings]
+    lengths = array("I", [len(b) for b in blobs])
+    if sys.byteorder != "little":
+        lengths.byteswap()
+    out = lengths.tobytes() + b"".join(blobs)
+    return out + b"\0" * _pad8(len(out))
+
+def _unpack_strings(buf: memoryview, off: int, n: int) -> Tuple[List[str], int]:
+    lengths = array("I", bytes(buf[off:off + 4 * n]))
+    if sys.byteorder != "little":
+        lengths.byteswap()
+    off += 4 * n
+    out: List[str] = []
+    for ln in lengths:
+        out.append(bytes(buf[off:off + ln]).decode("utf-8"))
+        off += ln
+    return out, off + _pad8(off)
+
+def _int64s(values: Sequence[int]) -> bytes:
+    a = array("q", values)
+    if sys.byteorder != "little":
+        a.byteswap()
+    return a.tobytes()
+
+def to_compact(model: NGramModel, packed: Optional[bool] = None) -> CompactNGramModel:
+    """The model's counts in CompactNGramModel form (the form that is written to disk)."""
+    if isinstance(model, CompactNGramModel):
+        return model
+    if isinstance(model, InterpolatedNGram):
+        raise TypeError("the binary model format stores Laplace counts only; "
+                        "refit InterpolatedNGram from the text instead of saving it")
+    counts = model.counts
+    if packed is None:
+        packed = any(isinstance(x, int) for x, _ in counts)
+    m = CompactNGramModel(k=model.k, alpha=model.alpha, packed=packed)
+    m.fit_counts(counts)
+    return m
+
+def save_model(model: NGramModel, path: PathLike, tokens: Sequence[str] = ()) -> None:
+    """
+    Write a versioned little-endian binary model: header, symbols, tokens, vocab ids, then the
+    four int64 count arrays, 8-byte aligned so load_model can map them in place.
+    """
+    m = to_compact(model)
+    if not isinstance(m.pair_keys, (array, memoryview)):
+        raise ValueError("pair codes exceed 64 bits; model too wide to save")
+    vocab_ids = sorted(m.symbols[y] for y in m.vocab)
+    header = _HEADER.pack(MAGIC, VERSION, m.k, m.alpha, int(m.packed), m.sym_bits,
+                          len(m.id_to_symbol), len(tokens), len(vocab_ids),
+                          len(m.ctx_keys), len(m.pair_keys))
+    parts = [header]
+    parts.append(_int64s(m.id_to_symbol) if m.packed else _pack_strings(m.id_to_symbol))
+    parts.append(_pack_strings(tokens))
+    parts.append(_int64s(vocab_ids))
+    for a in (m.ctx_keys, m.ctx_totals, m.pair_keys, m.pair_counts):
+        parts.append(_int64s(a))
+    with open(path, "wb") as f:
+        for part in parts:
+            f.write(part)
+
+def load_model(path: PathLike, use_mmap: bool = True) -> Tuple[CompactNGramModel, List[str]]:
+    """(model, tokens) from save_model; use_mmap maps the count arrays read-only in place."""
+    with open(path, "rb") as f:
+        if use_mmap:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buf = f.read()
+    view = memoryview(buf)
+    (magic, version, k, alpha, packed, sym_bits,
+     n_sym, n_tok, n_vocab, n_ctx, n_pairs) = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not an n-gram model file")
+    if version != VERSION:
+        raise ValueError(f"{path}: unsupported model format version {version}")
+    off = _HEADER.size
+
+    def int64s(n: int):
+        nonlocal off
+        raw = view[off:off + 8 * n]
+        off += 8 * n
+        if sys.byteorder != "little":
+            a = array("q", bytes(raw))
+            a.byteswap()
+            return a
+        return raw.cast("q")
+
+    m = CompactNGramModel(k=k, alpha=alpha, packed=bool(packed))
+    if packed:
+        symbols: list = list(int64s(n_sym))
+    else:
+        symbols, off = _unpack_strings(view, off, n_sym)
+    tokens, off = _unpack_strings(view, off, n_tok)
+    vocab_ids = int64s(n_vocab)
+
+    m.id_to_symbol = symbols
+    m.symbols = {s: i for i, s in enumerate(symbols)}
+    m.sym_bits = sym_bits
+    m.vocab = {symbols[i] for i in vocab_ids}
+    m.ctx_keys = int64s(n_ctx)
+    m.ctx_totals = int64s(n_ctx)
+    m.pair_keys = int64s(n_pairs)
+    m.pair_counts = int64s(n_pairs)
+    m._buffer = buf  # keeps the mapping alive for the views above
+    return m, tokens
@@ -1,34 +1,278 @@
+from array import array
+from contextlib import nullcontext
 from dataclasses import dataclass
-from typing import List, Tuple
-from .word_ngram import tokenize, WordNGram
+import heapq
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from . import instrument
+from .char_ngram import sum_log_probs
+from .multi_order import MultiOrderNGram
+from .retrieval import InvertedIndex
+from .word_ngram import tokenize, tokenize_ids, Vocabulary, WordNGram
 
 def jaccard(a: set[str], b: set[str]) -> float:
     if not a and not b:
         return 0.0
     return len(a & b) / len(a | b)
 
+FOIL_ANSWER = "A large language model is a conscious agent that understands meaning and reasons about the world like a human."
+
 @dataclass
 class QAItem:
     q: str
     a: str
 
+@dataclass
+class ItemFeatures:
+    """
+    Query-independent parts of an item's score, computed once at fit time. `interior` is
+    valid while `gen` equals its reranker's LM generation (QAReranker.interior).
+    """
+    q_set: Set[str]
+    a_ids: array
+    interior: Tuple[float, int]
+    no_sim: bool
+    gen: int = 0
+
+@dataclass
+class Ranked:
+    """One scored candidate: position in QAReranker.items plus the score components."""
+    index: int
+    item: QAItem
+    total: float
+    base: float
+    sim: float
+    n: int
+    count: int = 1
+
+def _popcount(x: int) -> int:
+    return bin(x).count("1")
+
 class QAReranker:
-    def __init__(self, k: int = 3, alpha: float = 0.5, lam: float = 0.0, normalize: bool = True):
+    """
+    LM reranker over QA items. With top_n set, answer() rescores only the top_n items by
+    question Jaccard from an inverted index; top_n=None scans every item.
+    """
+
+    def __init__(self, k: int = 3, alpha: float = 0.5, lam: float = 0.0, normalize: bool = True,
+                 top_n: Optional[int] = None):
         self.lm = WordNGram(k=k, alpha=alpha)
-        self.items: List[QAItem] = []
         self.lam = lam
         self.normalize = normalize
+        self.top_n = top_n
+        self._gen = 0
+        self._interiors: Dict[bytes, Tuple[float, int]] = {}
+        self.set_items([])
+
+    @staticmethod
+    def corpus_text(items: List[QAItem]) -> str:
+        return "\n".join([f"QTAG {it.q}\nATAG {it.a}\n" for it in items])
+
+    def fit(self, items: Iterable[QAItem], batch: int = 1024) -> None:
+        """Fit the LM on the items and install them; `items` may be any iterable."""
+        it = iter(items)
+        kept: List[QAItem] = []
+        while True:
+            chunk = list(islice(it, batch))
+            if not chunk:
+                break
+            # Later batches join the first, so the counts equal one fit_text of the whole corpus.
+            fit = self.lm.update_text if kept else self.lm.fit_text
+            fit(self.corpus_text(chunk))
+            kept.extend(chunk)
+        self.set_items(kept)
 
-    def fit(self, items: List[QAItem]) -> None:
-        self.items = items
-        corpus_text = "\n".join([f"QTAG {it.q}\nATAG {it.a}\n" for it in items])
-        self.lm.fit_text(corpus_text)
+    def set_items(self, items: List[QAItem]) -> None:
+        """Install items (already covered by the fitted LM) and precompute their features."""
+        self._lm_changed()
+        self._answers: Dict[str, array] = {}
+        self._install(items, [self.item_features(it, self._answers) for it in items])
+
+    def _install(self, items: List[QAItem], feats: List[ItemFeatures]) -> None:
+        self.items: List[QAItem] = []
+        self.features: Dict[int, ItemFeatures] = {}
+        self.item_features_list: List[ItemFeatures] = []
+        self.item_len: List[int] = []  # tokens of each item in the LM's stream
+        # Identical (q, a) items collapse into one row carrying a multiplicity.
+        self._rows: Dict[Tuple[str, str], int] = {}
+        self.row_of: List[int] = []
+        self.row_first: List[int] = []
+        self.row_count: List[int] = []
+        self.index = InvertedIndex()
+        self.token_bits: Dict[str, int] = {}
+        self.item_masks: List[int] = []
+        self._last_query: Optional[Tuple[str, array, Set[str]]] = None
+        self._append(items, feats)
+
+    def _append(self, items: List[QAItem], feats: List[ItemFeatures]) -> None:
+        for it, f in zip(items, feats):
+            j = len(self.items)
+            self.items.append(it)
+            self.features[id(it)] = f
+            self.item_features_list.append(f)
+            self.item_len.append(len(tokenize(it.q)) + len(f.a_ids) + 2)
+            r = self._rows.get((it.q, it.a))
+            if r is None:
+                r = self._rows[(it.q, it.a)] = len(self.row_first)
+                self.row_first.append(j)
+                self.row_count.append(0)
+            self.row_of.append(r)
+            self.row_count[r] += 1
+            self.index.add(f.q_set)
+            self.item_masks.append(self.token_mask(f.q_set, grow=True))
+
+    def _check_stream(self) -> None:
+        if self.lm.n_tokens != sum(self.item_len):
+            raise ValueError("the LM was not fitted on exactly these items; use fit()")
+
+    def _lm_changed(self) -> None:
+        """Answer interiors depend on all counts: mark every stored one stale (rescored when next read)."""
+        self._gen += 1
+        self._interiors = {}
+        self._last_query = None
+
+    def interior(self, f: ItemFeatures) -> Tuple[float, int]:
+        """f.interior, rescored first if the LM changed since it was computed (once per distinct answer)."""
+        if f.gen != self._gen:
+            key = f.a_ids.tobytes()
+            fresh = self._interiors.get(key)
+            if fresh is None:
+                fresh = self._interiors[key] = self.lm.answer_interior(f.a_ids)
+            f.interior = fresh
+            f.gen = self._gen
+        return f.interior
+
+    def add_items(self, items: List[QAItem]) -> None:
+        """Append items without a refit; scores equal those of fit(old items + items)."""
+        self._check_stream()
+        self.lm.update_text(self.corpus_text(items))
+        self._lm_changed()
+        self._append(items, [self.item_features(it, self._answers) for it in items])
+
+    def remove_items(self, indices: Iterable[int]) -> None:
+        """Drop the items at these positions; scores equal those of fit() on the rest."""
+        self._check_stream()
+        drop = set(indices)
+        starts = [0]
+        for n in self.item_len:
+            starts.append(starts[-1] + n)
+        # Splice runs right to left so earlier stream positions stay valid.
+        j = len(self.items) - 1
+        while j >= 0:
+            if j in drop:
+                end = j + 1
+                while j - 1 in drop:
+                    j -= 1
+                self.lm.splice(starts[j], starts[end])
+            j -= 1
+        keep = [j for j in range(len(self.items)) if j not in drop]
+        self._answers = {}
+        for j in keep:
+            self._answers.setdefault(self.items[j].a, self.item_features_list[j].a_ids)
+        self._install([self.items[j] for j in keep], [self.item_features_list[j] for j in keep])
+        self._lm_changed()
+
+    def token_mask(self, tokens: Iterable[str], grow: bool = False) -> int:
+        """Bitmap of tokens over the item-question vocabulary (unknown tokens are dropped unless grow)."""
+        bits = self.token_bits
+        m = 0
+        for t in tokens:
+            b = bits.get(t)
+            if b is None:
+                if not grow:
+                    continue
+                b = bits[t] = 1 << len(bits)
+            m |= b
+        return m
+
+    def item_features(self, item: QAItem, answers: Optional[Dict[str, array]] = None) -> ItemFeatures:
+        """Features of one item; `answers` shares token ids (and so interior scores) between identical answers."""
+        a_ids = answers.get(item.a) if answers is not None else None
+        if a_ids is None:
+            a_ids = tokenize_ids(item.a, self.lm.vocab)
+            if answers is not None:
+                answers[item.a] = a_ids
+        f = ItemFeatures(
+            q_set=set(tokenize(item.q)),
+            a_ids=a_ids,
+            interior=(0.0, 0),
+            no_sim=item.a.strip() == FOIL_ANSWER,
+            gen=-1,
+        )
+        if answers is None:
+            # A one-off item (score() on an item not installed): scored but not cached.
+            f.interior = self.lm.answer_interior(a_ids)
+            f.gen = self._gen
+        else:
+            self.interior(f)
+        return f
+
+    @classmethod
+    def fit_orders(cls, items: List[QAItem], ks: Iterable[int], alpha: float = 0.5,
+                   lam: float = 0.0, normalize: bool = True) -> Dict[int, "QAReranker"]:
+        """
+        One fitted reranker per k, sharing a single MultiOrderNGram counted in one pass;
+        scores are identical to fitting QAReranker(k=k) separately.
+        """
+        ks = list(ks)
+        vocab = Vocabulary()
+        multi = MultiOrderNGram(max(ks), alpha=alpha, packed=True)
+        multi.fit(tokenize_ids(cls.corpus_text(items), vocab, grow=True))
+        out: Dict[int, QAReranker] = {}
+        for k in ks:
+            rr = cls(k=k, alpha=alpha, lam=lam, normalize=normalize)
+            rr.lm = WordNGram(k=k, alpha=alpha, model=multi.order(k), vocab=vocab)
+            rr.set_items(items)
+            out[k] = rr
+        return out
+
+    def parse_query(self, q_star: str) -> Tuple[array, Set[str]]:
+        """(token ids, token set) of a query; the last query is cached."""
+        last = self._last_query
+        if last is None or last[0] != q_star:
+            stats = instrument.STATS
+            if stats is not None:
+                with stats.timer("qa.score.parse"):
+                    toks = tokenize(q_star)
+                    last = (q_star, self.lm.encode(toks), set(toks))
+            else:
+                toks = tokenize(q_star)
+                last = (q_star, self.lm.encode(toks), set(toks))
+            self._last_query = last
+        return last[1], last[2]
+
+    def _stages(self) -> Tuple[Callable, Callable]:
+        """
+        (lm.score_answer_tokens, combine): the two per-item scoring stages, timed under
+        qa.score.lm / qa.score.combine while instrumentation is on.
+        """
+        stats = instrument.STATS
+        if stats is None:
+            return self.lm.score_answer_tokens, self.combine
+        return (stats.timed("qa.score.lm", self.lm.score_answer_tokens),
+                stats.timed("qa.score.combine", self.combine))
 
     def score(self, q_star: str, item: QAItem) -> Tuple[float, float, float, int]:
-        lp, n = self.lm.score_answer_only(q_star, item.a)
-        sim = jaccard(set(tokenize(q_star)), set(tokenize(item.q)))
+        feat = self.features.get(id(item))
+        if feat is None:
+            feat = self.item_features(item)
+        q_ids, q_set = self.parse_query(q_star)
+        stats = instrument.STATS
+        if stats is not None:
+            stats.count("qa.items_scored")
+        return self.score_features(q_ids, q_set, feat)
+
+    def score_features(self, q_ids: array, q_set: Set[str],
+                       feat: ItemFeatures) -> Tuple[float, float, float, int]:
+        score_lm, combine = self._stages()
+        lp, n = score_lm(q_ids, feat.a_ids, self.interior(feat))
+        return combine(lp, n, q_set, feat)
 
-        if item.a.strip() == "A large language model is a conscious agent that understands meaning and reasons about the world like a human.":
+    def combine(self, lp: float, n: int, q_set: Set[str],
+                feat: ItemFeatures) -> Tuple[float, float, float, int]:
+        sim = jaccard(q_set, feat.q_set)
+
+        if feat.no_sim:
             sim = 0.0
 
         if self.normalize and n > 0:
@@ -39,13 +283,132 @@ class QAReranker:
         total = base + self.lam * sim
         return total, base, sim, n
 
-    def answer(self, q_star: str) -> QAItem:
-        best = None
+    def candidates(self, q_star: str, top_n: Optional[int] = None) -> List[int]:
+        """Item indices to rescore, in item order: all items, or the retrieval top_n."""
+        top_n = self.top_n if top_n is None else top_n
+        if top_n is None:
+            return list(range(len(self.items)))
+        _, q_set = self.parse_query(q_star)
+        hits = sorted(j for _, j in self.index.top(q_set, top_n))
+        return hits or list(range(len(self.items)))
+
+    def rank(self, q_star: str, n: Optional[int] = None) -> List[Ranked]:
+        """Distinct (q, a) rows ranked best first (ties to the earlier item), each with its `count`."""
+        q_ids, q_set = self.parse_query(q_star)
+        feats = self.item_features_list
+        score_lm, combine = self._stages()
+        lm_scores: Dict[int, Tuple[float, int]] = {}
+        out: List[Ranked] = []
+        for r in sorted({self.row_of[j] for j in self.candidates(q_star)}):
+            j = self.row_first[r]
+            f = feats[j]
+            lp_n = lm_scores.get(id(f.a_ids))
+            if lp_n is None:
+                lp_n = lm_scores[id(f.a_ids)] = score_lm(q_ids, f.a_ids, self.interior(f))
+            total, base, sim, m = combine(lp_n[0], lp_n[1], q_set, f)
+            out.append(Ranked(j, self.items[j], total, base, sim, m, self.row_count[r]))
+        stats = instrument.STATS
+        if stats is not None:
+            stats.count("qa.queries")
+            stats.count("qa.items_scored", len(out))
+            stats.count("qa.answers_lm_scored", len(lm_scores))
+        key = lambda x: (-x.total, x.index)
+        return sorted(out, key=key) if n is None else heapq.nsmallest(n, out, key=key)
+
+    def best_of(self, q_star: str, indices: Iterable[int]) -> int:
+        best = -1
         best_s = float("-inf")
-        for it in self.items:
-            total, _, _, _ = self.score(q_star, it)
+        for j in indices:
+            total, _, _, _ = self.score(q_star, self.items[j])
             if total > best_s:
                 best_s = total
-                best = it
-        assert best is not None
+                best = j
+        assert best >= 0
         return best
+
+    def answer(self, q_star: str) -> QAItem:
+        stats = instrument.STATS
+        if stats is not None:
+            stats.count("qa.queries")
+        return self.items[self.best_of(q_star, self.candidates(q_star))]
+
+    def candidate_recall(self, queries: Iterable[str], top_n: int) -> float:
+        """Fraction of queries where rescoring only the top_n candidates gives the exhaustive scan's answer."""
+        queries = list(queries)
+        if not queries:
+            raise ValueError("no queries")
+        hits = 0
+        for q in queries:
+            full = self.items[self.best_of(q, range(len(self.items)))]
+            got = self.items[self.best_of(q, self.candidates(q, top_n))]
+            hits += got.a == full.a
+        return hits / len(queries)
+
+    def answer_batch(self, queries: Sequence[str], top_k: int = 1) -> List[List[Ranked]]:
+        """Ranked top_k candidates per query; all boundary pairs go through one log_prob_batch call."""
+        k = self.lm.k
+        feats = self.item_features_list
+
+        parsed: Dict[str, Tuple[array, int, int, List[int]]] = {}
+        for q in queries:
+            if q not in parsed:
+                q_ids, q_set = self.parse_query(q)
+                parsed[q] = (q_ids, self.token_mask(q_set), len(q_set), self.candidates(q))
+
+        spans: Dict[Tuple[Tuple[int, ...], Tuple[int, ...]], Tuple[int, int]] = {}
+        xs: List[int] = []
+        ys: List[int] = []
+        for q_ids, _, _, cands in parsed.values():
+            tail = tuple(self.lm.prefix_ids(q_ids)[-k:])
+            for j in cands:
+                key = (tail, tuple(feats[j].a_ids[:k]))
+                if key in spans:
+                    continue
+                start = len(xs)
+                for x, y in self.lm.boundary_pairs(key[0], key[1]):
+                    xs.append(x)
+                    ys.append(y)
+                spans[key] = (start, len(xs))
+        stats = instrument.STATS
+        with stats.timer("qa.score.lm") if stats is not None else nullcontext():
+            lps = self.lm.model.log_prob_batch(xs, ys) if xs else []
+            boundary = {key: (sum_log_probs(lps[a:b]), b - a) for key, (a, b) in spans.items()}
+
+        results: Dict[str, List[Ranked]] = {}
+        with stats.timer("qa.score.combine") if stats is not None else nullcontext():
+            self._rank_batch(parsed, boundary, top_k, results)
+        if stats is not None:
+            stats.count("qa.queries", len(parsed))
+            stats.count("qa.items_scored", sum(len(c) for _, _, _, c in parsed.values()))
+            stats.count("lookup.boundary_spans", len(spans))
+        return [results[q] for q in queries]
+
+    def _rank_batch(self, parsed: Dict[str, Tuple[array, int, int, List[int]]],
+                    boundary: Dict[tuple, Tuple[float, int]], top_k: int,
+                    results: Dict[str, List[Ranked]]) -> None:
+        """answer_batch's combine stage: boundary + interior scores, bitmap Jaccard, top_k per query."""
+        k = self.lm.k
+        feats = self.item_features_list
+        sizes = [len(f.q_set) for f in feats]
+        for q, (q_ids, q_mask, q_size, cands) in parsed.items():
+            tail = tuple(self.lm.prefix_ids(q_ids)[-k:])
+            prefix_len = len(q_ids) + 2
+            ranked: List[Ranked] = []
+            for j in cands:
+                f = feats[j]
+                if self.lm.atag in f.a_ids:
+                    lp, n = self.lm.score_answer_tokens(q_ids, f.a_ids, self.interior(f))
+                elif prefix_len + len(f.a_ids) <= k:
+                    lp, n = 0.0, 0
+                else:
+                    b_lp, b_n = boundary[(tail, tuple(f.a_ids[:k]))]
+                    interior = self.interior(f)
+                    lp, n = b_lp + interior[0], b_n + interior[1]
+
+                ov = _popcount(q_mask & self.item_masks[j])
+                union = q_size + sizes[j] - ov
+                sim = 0.0 if f.no_sim or union == 0 else ov / union
+
+                base = lp / n if self.normalize and n > 0 else lp
+                ranked.append(Ranked(j, self.items[j], base + self.lam * sim, base, sim, n))
+            results[q] = heapq.nsmallest(top_k, ranked, key=lambda r: (-r.total, r.index))
@@ -0,0 +1,163 @@
+from __future__ import annotations
+from array import array
+from collections import Counter
+import math
+import random
+import sys
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from .char_ngram import np
+
+def _bincount(idx: Sequence[int], n: int, weights: Sequence[float] | None = None):
+    if np is not None:
+        return np.bincount(np.asarray(idx, dtype=np.int64), weights=weights, minlength=n)
+    out = [0] * n
+    if weights is None:
+        for i in idx:
+            out[i] += 1
+    else:
+        for i, w in zip(idx, weights):
+            out[i] += w
+    return out
+
+def _draw(rng: random.Random, n: int):
+    """
+    n positions uniform on [0, n) from 32 random bits each (multiply-shift, bias < n / 2**32):
+    one randbytes call, then an int64 array under NumPy or a list without it, same values.
+    """
+    if n >= 1 << 32:
+        raise ValueError("too many pairs to resample")
+    raw = rng.randbytes(4 * n)
+    if np is not None:
+        u = np.frombuffer(raw, dtype="<u4").astype(np.uint64)
+        return ((u * np.uint64(n)) >> np.uint64(32)).astype(np.int64)
+    u = array("I" if array("I").itemsize == 4 else "L", raw)
+    if sys.byteorder != "little":
+        u.byteswap()
+    return [(x * n) >> 32 for x in u]
+
+def summarize(values: Sequence[float], level: float = 0.95) -> Tuple[float, float, float]:
+    """(mean, lo, hi): the mean and the central `level` percentile interval (linear interpolation)."""
+    if not values:
+        raise ValueError("no values")
+    xs = sorted(values)
+
+    def pct(q: float) -> float:
+        pos = q * (len(xs) - 1)
+        i = int(pos)
+        j = min(i + 1, len(xs) - 1)
+        return xs[i] + (xs[j] - xs[i]) * (pos - i)
+
+    tail = (1 - level) / 2
+    return sum(xs) / len(xs), pct(tail), pct(1 - tail)
+
+def std_error(values: Sequence[float]) -> float:
+    n = len(values)
+    if n < 2:
+        return 0.0
+    mean = sum(values) / n
+    return math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1) / n)
+
+class LeaveOutCounts:
+    """
+    Resampled H_train / H_test of a Laplace NGramModel(alpha) without refitting: a resample's
+    model is the full count table minus its held-out counts, so its numbers equal a refit's.
+    """
+
+    def __init__(self, pairs: Iterable[Tuple[str, str]], alpha: float = 0.5):
+        if alpha <= 0:
+            raise ValueError("alpha must be > 0")
+        self.alpha = alpha
+        types: Dict[Tuple[str, str], int] = {}
+        contexts: Dict[str, int] = {}
+        targets: Dict[str, int] = {}
+        self.type_ctx = array("q")
+        self.type_y = array("q")
+        self.positions = array("q")  # type id of each pair, in input order
+        for x, y in pairs:
+            t = types.get((x, y))
+            if t is None:
+                t = types[(x, y)] = len(types)
+                self.type_ctx.append(contexts.setdefault(x, len(contexts)))
+                self.type_y.append(targets.setdefault(y, len(targets)))
+            self.positions.append(t)
+        if not self.positions:
+            raise ValueError("Empty pairs")
+        self.n_types = len(types)
+        self.n_contexts = len(contexts)
+        self.n_targets = len(targets)
+        self.counts = _bincount(self.positions, self.n_types)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def scores(self, train: Sequence[float], test: Sequence[float]) -> Tuple[float, float]:
+        """(H_train, H_test) of the model fit on per-type `train` counts; H_test is nan if `test` is empty."""
+        a = self.alpha
+        ctx_tot = _bincount(self.type_ctx, self.n_contexts, train)
+        y_tot = _bincount(self.type_y, self.n_targets, train)
+        if np is not None:
+            train = np.asarray(train, dtype=np.float64)
+            test = np.asarray(test, dtype=np.float64)
+            V = int(np.count_nonzero(y_tot))
+            if V == 0:
+                raise ValueError("Model has empty vocab; call fit() first.")
+            lp = np.log((train + a) / (ctx_tot[np.frombuffer(self.type_ctx, dtype=np.int64)] + a * V))
+            n_test = test.sum()
+            return (float(-(train @ lp) / train.sum()),
+                    float(-(test @ lp) / n_test) if n_test else math.nan)
+        V = sum(1 for c in y_tot if c)
+        if V == 0:
+            raise ValueError("Model has empty vocab; call fit() first.")
+        lp = [math.log((c + a) / (ctx_tot[x] + a * V)) for c, x in zip(train, self.type_ctx)]
+        n_test = sum(test)
+        return (-sum(c * l for c, l in zip(train, lp)) / sum(train),
+                -sum(c * l for c, l in zip(test, lp)) / n_test if n_test else math.nan)
+
+    def folds(self, n_folds: int = 5, seed: int = 42) -> List[array]:
+        """Pair positions of each fold: a random.Random(seed) shuffle cut into n_folds runs."""
+        if not 2 <= n_folds <= len(self):
+            raise ValueError("need 2 <= n_folds <= number of pairs")
+        order = array("q", range(len(self)))
+        random.Random(seed).shuffle(order)
+        n = len(order)
+        return [order[f * n // n_folds:(f + 1) * n // n_folds] for f in range(n_folds)]
+
+    def kfold(self, n_folds: int = 5, seed: int = 42) -> List[Tuple[float, float]]:
+        """(H_train, H_test) per fold, training on the other folds."""
+        out = []
+        for fold in self.folds(n_folds, seed):
+            if np is not None:
+                pos = np.frombuffer(self.positions, dtype=np.int64)
+                held = np.bincount(pos[np.frombuffer(fold, dtype=np.int64)], minlength=self.n_types)
+                train = self.counts - held
+            else:
+                held = _bincount([self.positions[i] for i in fold], self.n_types)
+                train = [c - h for c, h in zip(self.counts, held)]
+            out.append(self.scores(train, held))
+        return out
+
+    def bootstrap(self, n: int = 200, seed: int = 42) -> List[Tuple[float, float]]:
+        """(H_train, H_test) per bootstrap replicate, tested out-of-bag; same draws with or without NumPy."""
+        P = len(self)
+        rng = random.Random(seed)
+        out = []
+        if np is not None:
+            pos = np.frombuffer(self.positions, dtype=np.int64)
+            for _ in range(n):
+                w = np.bincount(_draw(rng, P), minlength=P)
+                train = np.bincount(pos, weights=w, minlength=self.n_types)
+                test = np.bincount(pos[w == 0], minlength=self.n_types)
+                out.append(self.scores(train, test))
+            return out
+        positions = self.positions
+        for _ in range(n):
+            # Per type: draws landing on it (train) and its positions never drawn (test).
+            train = [0] * self.n_types
+            test = list(self.counts)
+            for i, c in Counter(_draw(rng, P)).items():
+                t = positions[i]
+                train[t] += c
+                test[t] -= 1
+            out.append(self.scores(train, test))
+        return out
@@ -0,0 +1,48 @@
+from __future__ import annotations
+from array import array
+import heapq
+from typing import Dict, Iterable, List, Set, Tuple
+
+class InvertedIndex:
+    """
+    token -> ids of the documents (item questions) containing it; Jaccard is computed only
+    for documents sharing a token with the query, from overlap counts.
+    """
+
+    def __init__(self, docs: Iterable[Set[str]] = ()):
+        self.postings: Dict[str, array] = {}
+        self.sizes = array("i")
+        for doc in docs:
+            self.add(doc)
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def add(self, doc: Set[str]) -> int:
+        doc_id = len(self.sizes)
+        self.sizes.append(len(doc))
+        for t in doc:
+            ids = self.postings.get(t)
+            if ids is None:
+                ids = self.postings[t] = array("i")
+            ids.append(doc_id)
+        return doc_id
+
+    def overlaps(self, q_set: Set[str]) -> Dict[int, int]:
+        hits: Dict[int, int] = {}
+        for t in q_set:
+            for doc_id in self.postings.get(t, ()):
+                hits[doc_id] = hits.get(doc_id, 0) + 1
+        return hits
+
+    def jaccard(self, q_set: Set[str]) -> Dict[int, float]:
+        """Jaccard with every document sharing a token with q_set (all others are 0)."""
+        nq = len(q_set)
+        sizes = self.sizes
+        return {d: c / (nq + sizes[d] - c) for d, c in self.overlaps(q_set).items()}
+
+    def top(self, q_set: Set[str], n: int) -> List[Tuple[float, int]]:
+        """Up to n (jaccard, doc_id) with the highest similarity; ties go to lower ids."""
+        scored = self.jaccard(q_set)
+        best = heapq.nsmallest(n, ((-s, d) for d, s in scored.items()))
+        return [(-s, d) for s, d in best]
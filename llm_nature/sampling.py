@@ -0,0 +1,85 @@
+from __future__ import annotations
+from bisect import bisect_right
+from collections import OrderedDict
+import random
+from typing import Hashable, List, Optional, Sequence
+
+class LRU:
+    """Bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.data: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def get(self, key: Hashable):
+        value = self.data.get(key)
+        if value is not None:
+            self.data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value) -> None:
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.size:
+            self.data.popitem(last=False)
+
+class NextTable:
+    """
+    Sampling table for one context: cumulative weights over the listed successors plus a
+    `floor` weight per unlisted vocabulary symbol (Laplace mass).
+    """
+    __slots__ = ("ys", "cum", "mass", "total", "vocab", "seen", "unseen")
+
+    def __init__(self, ys: Sequence, weights: Sequence[float], floor: float, vocab: Sequence):
+        self.ys = list(ys)
+        self.cum: List[float] = []
+        s = 0.0
+        for w in weights:
+            s += w
+            self.cum.append(s)
+        self.mass = s
+        n_unseen = len(vocab) - len(self.ys) if floor > 0 else 0
+        self.total = s + floor * n_unseen
+        self.vocab = vocab
+        self.seen = set(self.ys) if n_unseen else set()
+        self.unseen: Optional[list] = None
+        if n_unseen and 2 * len(self.ys) > len(vocab):
+            self.unseen = [y for y in vocab if y not in self.seen]
+
+    def sample(self, rng: random.Random):
+        r = rng.random() * self.total
+        if r < self.mass:
+            return self.ys[bisect_right(self.cum, r)]
+        if self.unseen is not None:
+            return self.unseen[rng.randrange(len(self.unseen))]
+        vocab = self.vocab
+        while True:
+            y = vocab[rng.randrange(len(vocab))]
+            if y not in self.seen:
+                return y
+
+def next_table(ys: Sequence, weights: Sequence[float], floor: float, vocab: Sequence,
+               temperature: float) -> NextTable:
+    """
+    NextTable for p(y) proportional to weight(y) ** (1 / temperature) (floor for unlisted y).
+    temperature == 0 is greedy: the table always yields the most likely symbol.
+    """
+    if temperature < 0:
+        raise ValueError("temperature must be >= 0")
+    if not vocab:
+        raise ValueError("Model has empty vocab; call fit() first.")
+    top = max(weights, default=0.0)
+    if temperature == 0:
+        if top > floor:
+            return NextTable([ys[list(weights).index(top)]], [1.0], 0.0, vocab)
+        listed = set(ys)
+        return NextTable([next((y for y in vocab if y not in listed), vocab[0])], [1.0], 0.0, vocab)
+    if temperature == 1:
+        return NextTable(ys, weights, floor, vocab)
+    # Scale by the largest weight first so small temperatures cannot overflow.
+    m = max(top, floor)
+    e = 1.0 / temperature
+    return NextTable(ys, [(w / m) ** e for w in weights], (floor / m) ** e, vocab)
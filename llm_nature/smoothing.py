@@ -0,0 +1,147 @@
+from __future__ import annotations
+from dataclasses import dataclass
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import instrument
+from .char_ngram import NGramModel, np
+from .pairs import SLOT_BITS
+
+ESTIMATORS = ("kneser-ney", "witten-bell")
+
+def suffix(x, j: int):
+    """Last j symbols of a context: a string slice, or the low j slots of a pack_context code."""
+    if isinstance(x, int):
+        return x & ((1 << (SLOT_BITS * j)) - 1)
+    return x[len(x) - j:]
+
+@dataclass
+class InterpolatedNGram(NGramModel):
+    """
+    NGramModel whose prob() interpolates orders k, k-1, ..., 0 and a uniform floor:
+      P_j(y|x) = a_j(x, y) + g_j(x) * P_{j-1}(y|x[1:]),   P_{-1}(y) = 1/|V|
+    "witten-bell":  a = C(x,y) / (C(x,·) + N1+(x·)),         g = N1+(x·) / (C(x,·) + N1+(x·))
+    "kneser-ney":   a = max(C(x,y) - D_j, 0) / C(x,·),       g = D_j * N1+(x·) / C(x,·)
+    D_j = n1 / (n1 + 2 n2) unless `discount` is given; tables are built on first query.
+    """
+    method: str = "kneser-ney"
+    discount: Optional[float] = None
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        if self.method not in ESTIMATORS:
+            raise ValueError(f"method must be one of {ESTIMATORS}")
+        if self.discount is not None and not 0 < self.discount < 1:
+            raise ValueError("discount must be in (0, 1)")
+        self._probs: Optional[List[Dict[tuple, float]]] = None
+        self._backoff: List[Dict[object, float]] = []
+        self._successors: List[Dict[object, List[Tuple[object, float]]]] = []
+
+    def _invalidate(self) -> None:
+        # Every count update lands here; the tables are rebuilt once, on the next query.
+        super()._invalidate()
+        self._probs = None
+
+    def prune_scores(self, method: str = "count") -> Dict[Tuple[str, str], float]:
+        if method == "entropy":
+            # NGramModel's closed form assumes Laplace renormalisation, not backoff to lower orders.
+            raise ValueError("entropy pruning is derived for Laplace smoothing; use method='count'")
+        return super().prune_scores(method)
+
+    def _discount(self, counts: Dict[tuple, int]) -> float:
+        if self.discount is not None:
+            return self.discount
+        n1 = sum(c == 1 for c in counts.values())
+        n2 = sum(c == 2 for c in counts.values())
+        return n1 / (n1 + 2 * n2) if n1 and n2 else 0.5
+
+    def build(self) -> List[Dict[tuple, float]]:
+        """Precompute the per-order probability and backoff tables from the counts."""
+        k = self.k
+        kn = self.method == "kneser-ney"
+        levels: List[Dict[tuple, int]] = [{} for _ in range(k + 1)]
+        levels[k] = self.counts
+        for j in range(k - 1, -1, -1):
+            lower = levels[j]
+            for (x, y), c in levels[j + 1].items():
+                key = (suffix(x, j), y)
+                lower[key] = lower.get(key, 0) + (1 if kn else c)
+
+        uniform = 1.0 / len(self.vocab) if self.vocab else 0.0
+        probs: List[Dict[tuple, float]] = []
+        backoff: List[Dict[object, float]] = []
+        successors: List[Dict[object, List[Tuple[object, float]]]] = []
+        for j, counts in enumerate(levels):
+            totals: Dict[object, int] = {}
+            types: Dict[object, int] = {}
+            for (x, _), c in counts.items():
+                totals[x] = totals.get(x, 0) + c
+                types[x] = types.get(x, 0) + 1
+            if kn:
+                d = self._discount(counts)
+                g = {x: d * types[x] / t for x, t in totals.items()}
+                a = lambda c, t, n: max(c - d, 0.0) / t
+            else:
+                g = {x: n / (totals[x] + n) for x, n in types.items()}
+                a = lambda c, t, n: c / (t + n)
+            below = probs[j - 1] if j else None
+            p: Dict[tuple, float] = {}
+            succ: Dict[object, List[Tuple[object, float]]] = {}
+            for (x, y), c in counts.items():
+                lower = below[(suffix(x, j - 1), y)] if j else uniform
+                p[(x, y)] = pxy = a(c, totals[x], types[x]) + g[x] * lower
+                succ.setdefault(x, []).append((y, pxy))
+            probs.append(p)
+            backoff.append(g)
+            successors.append(succ)
+        self._probs = probs
+        self._backoff = backoff
+        self._successors = successors
+        return probs
+
+    def prob(self, x: str, y: str) -> float:
+        V = len(self.vocab)
+        if V == 0:
+            raise ValueError("Model has empty vocab; call fit() first.")
+        probs = self._probs if self._probs is not None else self.build()
+        backoff = self._backoff
+        g = 1.0
+        for j in range(self.k, -1, -1):
+            xj = suffix(x, j)
+            p = probs[j].get((xj, y))
+            if p is not None:
+                return g * p
+            g *= backoff[j].get(xj, 1.0)
+        return g / V
+
+    def next_probs(self, x: str) -> Tuple[Dict[str, float], float]:
+        # Walk up from order 0: a seen context scales everything below it by its backoff
+        # weight and overwrites its own successors with their full P_j. Symbols never listed
+        # keep the scaled uniform floor.
+        V = len(self.vocab)
+        if V == 0:
+            raise ValueError("Model has empty vocab; call fit() first.")
+        if self._probs is None:
+            self.build()
+        listed: Dict[str, float] = {}
+        rest = 1.0 / V
+        for j in range(self.k + 1):
+            xj = suffix(x, j)
+            g = self._backoff[j].get(xj)
+            if g is None:
+                continue
+            for y in listed:
+                listed[y] *= g
+            rest *= g
+            listed.update(self._successors[j][xj])
+        return listed, rest
+
+    def log_prob_batch(self, contexts: Sequence[str], targets: Sequence[str]):
+        if len(contexts) != len(targets):
+            raise ValueError("contexts and targets must have the same length")
+        stats = instrument.STATS
+        if stats is not None:
+            stats.count("lookup.pairs", len(contexts))
+        prob = self.prob
+        lps = [math.log(prob(x, y)) for x, y in zip(contexts, targets)]
+        return np.asarray(lps, dtype=np.float64) if np is not None else lps
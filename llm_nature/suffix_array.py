@@ -0,0 +1,272 @@
+from __future__ import annotations
+from array import array
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from .char_ngram import NGramModel
+from .pairs import pack_context, unpack_context
+
+def suffix_array(ids: Sequence[int]) -> array:
+    """Suffix array by prefix doubling: O(n log^2 n), ints only."""
+    n = len(ids)
+    sa = list(range(n))
+    rank = list(ids)
+    h = 1
+    while n > 1:
+        def key(i: int) -> Tuple[int, int]:
+            return rank[i], rank[i + h] if i + h < n else -1
+        sa.sort(key=key)
+        new = [0] * n
+        for j in range(1, n):
+            new[sa[j]] = new[sa[j - 1]] + (key(sa[j]) != key(sa[j - 1]))
+        rank = new
+        if rank[sa[-1]] == n - 1:
+            break
+        h <<= 1
+    return array("q", sa)
+
+def lcp_array(ids: Sequence[int], sa: Sequence[int]) -> array:
+    """Kasai: lcp[j] = longest common prefix of suffixes sa[j-1] and sa[j] (lcp[0] = 0)."""
+    n = len(ids)
+    rank = [0] * n
+    for j, i in enumerate(sa):
+        rank[i] = j
+    lcp = array("q", [0] * n)
+    h = 0
+    for i in range(n):
+        r = rank[i]
+        if r == 0:
+            h = 0
+            continue
+        j = sa[r - 1]
+        while i + h < n and j + h < n and ids[i + h] == ids[j + h]:
+            h += 1
+        lcp[r] = h
+        if h:
+            h -= 1
+    return lcp
+
+class SuffixArrayIndex:
+    """
+    Suffix array (+ LCP) over a char string or token sequence. An n-gram count is the width of
+    its suffix-array interval, found by binary search, so order(k) works for any k.
+    """
+
+    def __init__(self, seq: Sequence, packed: bool = False):
+        self.packed = packed
+        self.generation = 0
+        self.build(seq)
+
+    def build(self, seq: Sequence) -> None:
+        """(Re)index seq from scratch; views from order() answer from the new text."""
+        self.symbols: Dict[str, int] = {}
+        ids = array("i")
+        for s in seq:
+            i = self.symbols.get(s)
+            if i is None:
+                i = self.symbols[s] = len(self.symbols)
+            ids.append(i)
+        self.ids = ids
+        self.sa = suffix_array(ids)
+        self.lcp = lcp_array(ids, self.sa)
+        self.last_pos: Dict[str, int] = {}
+        for pos, s in enumerate(seq):
+            self.last_pos[s] = pos
+        self._vocab_cache: Dict[int, Set[str]] = {}
+        self.generation += 1
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def encode(self, symbols: Sequence[str]) -> Optional[array]:
+        out = array("i")
+        for s in symbols:
+            i = self.symbols.get(s)
+            if i is None:
+                return None
+            out.append(i)
+        return out
+
+    def interval(self, pat: array, lo: int = 0, hi: Optional[int] = None) -> Tuple[int, int]:
+        """[lo, hi) of suffix-array rows whose suffix starts with pat."""
+        ids = self.ids
+        sa = self.sa
+        m = len(pat)
+        hi = len(sa) if hi is None else hi
+        a, b = lo, hi
+        while a < b:
+            mid = (a + b) // 2
+            i = sa[mid]
+            if ids[i:i + m] < pat:
+                a = mid + 1
+            else:
+                b = mid
+        start = a
+        b = hi
+        while a < b:
+            mid = (a + b) // 2
+            i = sa[mid]
+            if ids[i:i + m] <= pat:
+                a = mid + 1
+            else:
+                b = mid
+        return start, a
+
+    def count(self, symbols: Sequence[str]) -> int:
+        pat = self.encode(symbols)
+        if pat is None:
+            return 0
+        lo, hi = self.interval(pat)
+        return hi - lo
+
+    def vocab(self, k: int) -> Set[str]:
+        v = self._vocab_cache.get(k)
+        if v is None:
+            v = self._vocab_cache[k] = {s for s, i in self.last_pos.items() if i >= k}
+        return v
+
+    def split_context(self, x, k: int) -> Sequence:
+        return unpack_context(x, k) if self.packed else x
+
+    def order(self, k: int, alpha: float = 0.5) -> "SuffixArrayView":
+        return SuffixArrayView(self, k, alpha)
+
+class SuffixArrayView(NGramModel):
+    """Order-k NGramModel answered from a SuffixArrayIndex (read-only)."""
+
+    def __init__(self, index: SuffixArrayIndex, k: int, alpha: float = 0.5):
+        if k < 1:
+            raise ValueError("k must be >= 1")
+        if alpha <= 0:
+            raise ValueError("alpha must be > 0")
+        self.index = index
+        self.k = k
+        self.alpha = alpha
+
+    @property
+    def vocab(self) -> Set[str]:
+        return self.index.vocab(self.k)
+
+    def _derived(self) -> dict:
+        gen = self.index.generation
+        if self.__dict__.get("_generation") != gen:
+            self.__dict__["_generation"] = gen
+            self._invalidate()
+        return super()._derived()
+
+    def _runs(self, m: int):
+        """(first SA row, count) per distinct m-gram that has a successor, from LCP runs."""
+        idx = self.index
+        sa, lcp = idx.sa, idx.lcp
+        last = len(sa) - self.k - 1
+        start, c, run = 0, 0, m
+        for j in range(len(sa)):
+            run = min(run, lcp[j])
+            if sa[j] > last:
+                continue
+            if c and run < m:
+                yield start, c
+                c = 0
+            if not c:
+                start = j
+            c += 1
+            run = m
+        if c:
+            yield start, c
+
+    @property
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        """Decoded {(x, y): C(x,y)} for this order; one decode per distinct pair, via LCP runs."""
+        idx = self.index
+        k = self.k
+        names = list(idx.symbols)
+        ids, sa = idx.ids, idx.sa
+        join = pack_context if idx.packed else "".join
+        out: Dict[Tuple[str, str], int] = {}
+        for j, c in self._runs(k + 1):
+            i = sa[j]
+            out[(join([names[s] for s in ids[i:i + k]]), names[ids[i + k]])] = c
+        return out
+
+    @property
+    def context_totals(self) -> Dict[str, int]:
+        """Decoded {x: C(x,·)} for this order, via LCP runs."""
+        idx = self.index
+        k = self.k
+        names = list(idx.symbols)
+        ids, sa = idx.ids, idx.sa
+        join = pack_context if idx.packed else "".join
+        return {join([names[s] for s in ids[sa[j]:sa[j] + k]]): c for j, c in self._runs(k)}
+
+    def fit(self, pairs, workers: int = 1) -> None:
+        raise TypeError("SuffixArrayView is read-only; call build() on the SuffixArrayIndex")
+
+    def fit_counts(self, counts) -> None:
+        raise TypeError("SuffixArrayView is read-only; call build() on the SuffixArrayIndex")
+
+    def merge(self, other) -> None:
+        raise TypeError("SuffixArrayView is read-only; call build() on the SuffixArrayIndex")
+
+    def forget_counts(self, counts, keep_vocab: bool = False) -> None:
+        raise TypeError("SuffixArrayView is read-only; call build() on the SuffixArrayIndex")
+
+    def prune(self, threshold=None, max_bytes=None, method: str = "count") -> int:
+        raise TypeError("SuffixArrayView is read-only; call build() on the SuffixArrayIndex")
+
+    def context_counts(self, x: str) -> Tuple[array, int, int, int]:
+        """(encoded x, SA interval lo, hi, C(x,·)); C(x,·) excludes an occurrence ending the text."""
+        idx = self.index
+        syms = idx.split_context(x, self.k)
+        pat = idx.encode(syms) if len(syms) == self.k else None
+        if pat is None:
+            return array("i"), 0, 0, 0
+        lo, hi = idx.interval(pat)
+        c_x = hi - lo
+        if c_x and idx.ids[len(idx.ids) - self.k:] == pat:
+            c_x -= 1
+        return pat, lo, hi, c_x
+
+    def _pair_count(self, pat: array, lo: int, hi: int, y: str) -> int:
+        yi = self.index.symbols.get(y)
+        if yi is None or hi <= lo:
+            return 0
+        lo2, hi2 = self.index.interval(pat + array("i", [yi]), lo, hi)
+        return hi2 - lo2
+
+    def successors(self, x: str) -> Tuple[Sequence[str], Sequence[int]]:
+        # Read from the C(x,·) suffix-array rows of x's interval; no successor index is kept.
+        idx = self.index
+        _, lo, hi, _ = self.context_counts(x)
+        d = self._derived()
+        names = d.get("names")
+        if names is None:
+            names = d["names"] = list(idx.symbols)
+        n = len(idx.ids)
+        runs: Dict[int, int] = {}
+        for r in range(lo, hi):
+            j = idx.sa[r] + self.k
+            if j < n:
+                runs[idx.ids[j]] = runs.get(idx.ids[j], 0) + 1
+        found = sorted((names[i], c) for i, c in runs.items())
+        return tuple(y for y, _ in found), tuple(c for _, c in found)
+
+    def prob(self, x: str, y: str) -> float:
+        V = len(self.vocab)
+        if V == 0:
+            raise ValueError("Model has empty vocab; call fit() first.")
+        pat, lo, hi, c_x = self.context_counts(x)
+        c_xy = self._pair_count(pat, lo, hi, y)
+        return (c_xy + self.alpha) / (c_x + self.alpha * V)
+
+    def count_batch(self, contexts: Sequence[str],
+                    targets: Sequence[str]) -> Tuple[Sequence[int], Sequence[int]]:
+        cache: Dict[str, Tuple[array, int, int, int]] = {}
+        c_xy: List[int] = []
+        c_x: List[int] = []
+        for x, y in zip(contexts, targets):
+            entry = cache.get(x)
+            if entry is None:
+                entry = cache[x] = self.context_counts(x)
+            pat, lo, hi, cx = entry
+            c_xy.append(self._pair_count(pat, lo, hi, y))
+            c_x.append(cx)
+        return c_xy, c_x
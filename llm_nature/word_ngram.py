@@ -1,46 +1,222 @@
+from __future__ import annotations
+from array import array
+from itertools import repeat
+import random
 import re
-import math
+import string
+from typing import Iterable, Sequence
+from . import instrument
 from .char_ngram import NGramModel
+from .pairs import IdPairView, pack_context
 
 _word_re = re.compile(r"[A-Za-z0-9']+")
+_word_chars = frozenset(string.ascii_letters + string.digits + "'")
 
 def tokenize(text: str) -> list[str]:
-    return [m.group(0).lower() for m in _word_re.finditer(text)]
+    # Tokens are ASCII and space-free, so one lower() over the joined tokens is per-token lower().
+    toks = " ".join(_word_re.findall(text)).lower().split()
+    stats = instrument.STATS
+    if stats is not None:
+        stats.count("tokenize.calls")
+        stats.count("tokenize.tokens", len(toks))
+    return toks
 
 def join_tokens(tokens: list[str]) -> str:
     return " ".join(tokens)
 
+class Vocabulary:
+    """
+    Interns tokens to dense int ids. Id 0 is reserved for tokens that were never added
+    ("<unk>", which the tokenizer cannot produce), so lookups never grow the table.
+    """
+    UNK = 0
+
+    def __init__(self, tokens: Iterable[str] = ()):
+        self.tokens: list[str] = ["<unk>"]
+        self.ids: dict[str, int] = {"<unk>": self.UNK}
+        for t in tokens:
+            self.add(t)
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self.ids
+
+    def add(self, token: str) -> int:
+        i = self.ids.get(token)
+        if i is None:
+            i = self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+        return i
+
+    def get(self, token: str) -> int:
+        return self.ids.get(token, self.UNK)
+
+    def encode(self, tokens: Sequence[str], grow: bool = False) -> array:
+        ids = self.ids
+        if grow:
+            for t in dict.fromkeys(tokens):
+                if t not in ids:
+                    self.add(t)
+            return array("i", map(ids.__getitem__, tokens))
+        return array("i", map(ids.get, tokens, repeat(self.UNK)))
+
+    def decode(self, ids: Iterable[int]) -> list[str]:
+        return [self.tokens[i] for i in ids]
+
+def tokenize_ids(text: str, vocab: Vocabulary, grow: bool = False) -> array:
+    return vocab.encode(tokenize(text), grow=grow)
+
+def _whole_words(chunks: Iterable[str]) -> Iterable[str]:
+    """Re-cut text chunks so that no token is split across two of them."""
+    rest = ""
+    for chunk in chunks:
+        text = rest + chunk
+        i = len(text)
+        while i > 0 and text[i - 1] in _word_chars:
+            i -= 1
+        rest = text[i:]
+        if i:
+            yield text[:i]
+    if rest:
+        yield rest
+
 class WordNGram:
-    def __init__(self, k: int, alpha: float = 0.5):
+    """
+    Word-level wrapper around an NGramModel. Tokens are interned in `vocab` and the model
+    is keyed by packed context ids (pack_context) and next-token ids, not joined strings.
+    """
+
+    def __init__(self, k: int, alpha: float = 0.5, model: NGramModel | None = None,
+                 vocab: Vocabulary | None = None):
         self.k = k
-        self.model = NGramModel(k=k, alpha=alpha)
+        self.model = model if model is not None else NGramModel(k=k, alpha=alpha)
+        self.vocab = vocab if vocab is not None else Vocabulary()
+        self.qtag = self.vocab.add("qtag")
+        self.atag = self.vocab.add("atag")
+        self.ids = array("i")  # the fitted token stream from position `offset` on
+        self.offset = 0
+
+    def encode(self, tokens: Iterable[str], grow: bool = False) -> array:
+        return self.vocab.encode(tokens, grow=grow)
+
+    def build_pairs(self, tokens: list[str]) -> list[tuple[int, int]]:
+        return list(self.pair_view(self.encode(tokens)))
+
+    def pair_view(self, ids: Sequence[int]) -> IdPairView:
+        return IdPairView(ids, self.k)
+
+    def context(self, tokens: list[str]) -> int:
+        """Model key of a k-token context."""
+        return pack_context(self.encode(tokens))
+
+    @property
+    def n_tokens(self) -> int:
+        """Length of the fitted token stream."""
+        return self.offset + len(self.ids)
 
-    def build_pairs(self, tokens: list[str]) -> list[tuple[str, str]]:
-        pairs = []
-        for i in range(len(tokens) - self.k):
-            x = join_tokens(tokens[i:i+self.k])
-            y = tokens[i+self.k]
-            pairs.append((x, y))
-        return pairs
+    def fit_text(self, text: str, workers: int = 1) -> None:
+        """
+        Count text's pairs on their own, like NGramModel.fit_text: nothing is joined to
+        earlier texts. This text becomes the stream that update_text and splice edit.
+        """
+        self.ids = array("i")
+        self.offset = 0
+        self.update_text(text, workers=workers)
 
-    def fit_text(self, text: str) -> None:
-        toks = tokenize(text)
-        pairs = self.build_pairs(toks)
-        self.model.fit(pairs)
+    def update_text(self, text: str, workers: int = 1) -> None:
+        """
+        Append text to the stream: only its own pairs and the k pairs crossing the join with
+        the end of the stream are counted, as if the joined stream had been fitted in one go.
+        """
+        ids = tokenize_ids(text, self.vocab, grow=True)
+        self.splice(self.n_tokens, self.n_tokens, ids, workers=workers)
+
+    def fit_stream(self, chunks: Iterable[str], workers: int = 1) -> None:
+        """fit_text on the concatenated chunks in bounded memory; only the last k ids are kept afterwards."""
+        self.ids = array("i")
+        self.offset = 0
+        for text in _whole_words(chunks):
+            self.update_text(text, workers=workers)
+            drop = len(self.ids) - self.k
+            if drop > 0:
+                del self.ids[:drop]
+                self.offset += drop
+
+    def splice(self, start: int, end: int, ids: Sequence[int] = (), workers: int = 1) -> None:
+        """Replace stream[start:end] with ids, updating only the pairs that change."""
+        k = self.k
+        lo = max(start, k) - self.offset
+        if lo - k < 0:
+            raise ValueError(f"stream before position {self.offset} is no longer kept (fit_stream)")
+        start -= self.offset
+        end -= self.offset
+
+        def window(stop: int) -> IdPairView:
+            stop = min(stop, len(self.ids))
+            return self.pair_view(self.ids[lo - k:stop] if stop > lo else array("i"))
+
+        self.model.forget(window(end + k))
+        self.ids[start:end] = array("i", ids)
+        self.model.fit(window(start + len(ids) + k), workers=workers)
+
+    def generate(self, prefix: str, n: int, temperature: float = 1.0,
+                 seed: int | None = None) -> str:
+        """n sampled tokens continuing prefix, space-joined (temperature 0 is greedy)."""
+        return self.generate_batch([prefix], n, temperature, seed)[0]
+
+    def generate_batch(self, prefixes: Sequence[str], n: int, temperature: float = 1.0,
+                       seed: int | None = None) -> list[str]:
+        """
+        generate() for many prefixes in lockstep (NGramModel.generate_batch on token ids).
+        Prefixes shorter than k are left-padded with Vocabulary.UNK.
+        """
+        rng = random.Random(seed)
+        k = self.k
+        ctxs = []
+        for p in prefixes:
+            ids = list(tokenize_ids(p, self.vocab)[-k:])
+            ctxs.append([Vocabulary.UNK] * (k - len(ids)) + ids)
+        outs: list[list[int]] = [[] for _ in prefixes]
+        for _ in range(n):
+            codes = [pack_context(c) for c in ctxs]
+            for i, y in enumerate(self.model.sample_next(codes, rng, temperature)):
+                outs[i].append(y)
+                ctxs[i] = ctxs[i][1:] + [y]
+        return [join_tokens(self.vocab.decode(o)) for o in outs]
+
+    def save(self, path) -> None:
+        """Write the model and its vocabulary (persist.save_model)."""
+        from .persist import save_model
+        save_model(self.model, path, tokens=self.vocab.tokens[1:])
+
+    @classmethod
+    def load(cls, path, use_mmap: bool = True) -> "WordNGram":
+        from .persist import load_model
+        model, tokens = load_model(path, use_mmap=use_mmap)
+        return cls(model.k, model=model, vocab=Vocabulary(tokens))
 
     def score_answer_only(self, q: str, a: str) -> tuple[float, int]:
-        prefix = f"qtag {q} atag"
-        prefix_toks = tokenize(prefix)
-        full_toks = prefix_toks + tokenize(a)
+        """Score a's tokens after "qtag {q} atag"; only q's last k tokens are encoded."""
+        a_ids = tokenize_ids(a, self.vocab)
+        if self.atag in a_ids:
+            return self._score_full(self.prefix_ids(tokenize_ids(q, self.vocab)) + a_ids)
+        prefix = self.prefix_ids(self.encode(tokenize(q)[-self.k:]))
+        if len(prefix) + len(a_ids) <= self.k:
+            return 0.0, 0
+        pairs = self.pair_view(prefix[-self.k:] + a_ids)
+        return self.model.log_prob_pairs(pairs), len(pairs)
 
-        if len(full_toks) <= self.k:
+    def _score_full(self, full_ids: array) -> tuple[float, int]:
+        if len(full_ids) <= self.k:
             return 0.0, 0
 
-        pairs = self.build_pairs(full_toks)
+        pairs = self.pair_view(full_ids)
 
         atag_idx = None
-        for i, t in enumerate(full_toks):
-            if t == "atag":
+        for i, t in enumerate(full_ids):
+            if t == self.atag:
                 atag_idx = i
         if atag_idx is None:
             raise RuntimeError("atag marker missing")
@@ -51,12 +227,40 @@ class WordNGram:
         if first_pair_index < 0:
             first_pair_index = 0
 
-        lp = 0.0
-        n = 0
-        for j in range(first_pair_index, len(pairs)):
-            x, y = pairs[j]
-            p = self.model.prob(x, y)
-            lp += math.log(p)
-            n += 1
+        scored = pairs[first_pair_index:]
+        return self.model.log_prob_pairs(scored), len(scored)
+
+    def answer_interior(self, a_ids: Sequence[int]) -> tuple[float, int]:
+        """Log-prob and count of the pairs lying wholly inside the answer; independent of the query."""
+        if len(a_ids) <= self.k:
+            return 0.0, 0
+        pairs = self.pair_view(a_ids)
+        return self.model.log_prob_pairs(pairs), len(pairs)
+
+    def prefix_ids(self, q_ids: Sequence[int]) -> array:
+        return array("i", [self.qtag]) + array("i", q_ids) + array("i", [self.atag])
+
+    def score_answer_tokens(self, q_ids: Sequence[int], a_ids: Sequence[int],
+                            interior: tuple[float, int] | None = None) -> tuple[float, int]:
+        """
+        score_answer_only on pre-encoded input; with interior=answer_interior(a_ids) only the
+        <= k pairs reaching back into the prefix are scored here.
+        """
+        prefix = self.prefix_ids(q_ids)
+        if self.atag in a_ids:
+            # The scored span starts after the last marker, which is then inside the answer.
+            return self._score_full(prefix + array("i", a_ids))
+        if len(prefix) + len(a_ids) <= self.k:
+            return 0.0, 0
+        if interior is None:
+            interior = self.answer_interior(a_ids)
+
+        boundary = self.boundary_pairs(prefix, a_ids)
+        lp = self.model.log_prob_pairs(boundary) + interior[0]
+        return lp, len(boundary) + interior[1]
 
-        return lp, n
+    def boundary_pairs(self, prefix: Sequence[int], a_ids: Sequence[int]) -> IdPairView:
+        """Scored pairs whose context reaches into the prefix; they depend only on prefix[-k:] and a_ids[:k]."""
+        tail = array("i", prefix[-self.k:])
+        head = tail + array("i", a_ids[:self.k])
+        return self.pair_view(head).take(range(max(min(len(tail), len(head) - self.k), 0)))
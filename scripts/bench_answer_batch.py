@@ -0,0 +1,41 @@
+from __future__ import annotations
+from pathlib import Path
+import random
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from llm_nature.dataset import load_qa_corpus
+from llm_nature.instrument import run_main
+from llm_nature.qa import QAReranker
+
+def main():
+    n_queries = 10_000
+    items = load_qa_corpus()
+    rng = random.Random(0)
+    words = " ".join(it.q for it in items).split()
+    queries = [" ".join(rng.choice(words) for _ in range(rng.randint(3, 8))) + "?"
+               for _ in range(n_queries)]
+
+    print("| k | looped q/s | batch q/s | speedup |")
+    print("|---:|---:|---:|---:|")
+    for k in (1, 3, 8):
+        rr = QAReranker(k=k, alpha=0.5, lam=0.2)
+        rr.fit(items)
+
+        t0 = time.perf_counter()
+        looped = [rr.answer(q) for q in queries]
+        t1 = time.perf_counter()
+        batch = rr.answer_batch(queries, top_k=1)
+        t2 = time.perf_counter()
+
+        agree = sum(a.a == r[0].item.a for a, r in zip(looped, batch))
+        if agree != n_queries:
+            raise RuntimeError(f"batch disagrees with looped answer on {n_queries - agree} queries")
+        lq, bq = n_queries / (t1 - t0), n_queries / (t2 - t1)
+        print(f"| {k} | {lq:.0f} | {bq:.0f} | {bq / lq:.1f}x |")
+
+if __name__ == "__main__":
+    run_main(main)
@@ -0,0 +1,53 @@
+from __future__ import annotations
+from pathlib import Path
+import random
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from llm_nature.char_ngram import NGramModel
+from llm_nature.dataset import load_paragraph
+from llm_nature.instrument import run_main
+from llm_nature.word_ngram import WordNGram
+
+def naive_generate(m: NGramModel, prefix: str, n: int, seed: int) -> str:
+    """Reference: evaluate prob() for every vocab symbol at every step."""
+    rng = random.Random(seed)
+    vocab = m.vocab_list()
+    ctx = prefix[-m.k:]
+    out = []
+    for _ in range(n):
+        y = rng.choices(vocab, weights=[m.prob(ctx, v) for v in vocab])[0]
+        out.append(y)
+        ctx = (ctx + y)[-m.k:]
+    return "".join(out)
+
+def rate(fn, n_tokens: int) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return n_tokens / (time.perf_counter() - t0)
+
+def main():
+    text = load_paragraph() * 10
+    n = 2_000
+    n_seqs = 256
+    print("| model | k | naive tok/s | generate tok/s | batch x256 tok/s |")
+    print("|---|---:|---:|---:|---:|")
+    for k in (1, 3, 6):
+        m = NGramModel(k=k, alpha=0.5)
+        m.fit_text(text)
+        naive = rate(lambda: naive_generate(m, "Large", n, 0), n)
+        single = rate(lambda: m.generate("Large", n, seed=0), n)
+        batch = rate(lambda: m.generate_batch(["Large"] * n_seqs, n // 10, seed=0), n_seqs * (n // 10))
+        print(f"| char | {k} | {naive:.0f} | {single:.0f} | {batch:.0f} |")
+
+        w = WordNGram(k=k)
+        w.fit_text(text)
+        single = rate(lambda: w.generate("large language", n, seed=0), n)
+        batch = rate(lambda: w.generate_batch(["large language"] * n_seqs, n // 10, seed=0), n_seqs * (n // 10))
+        print(f"| word | {k} | - | {single:.0f} | {batch:.0f} |")
+
+if __name__ == "__main__":
+    run_main(main)
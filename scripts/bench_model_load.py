@@ -0,0 +1,40 @@
+from __future__ import annotations
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from llm_nature.char_ngram import NGramModel
+from llm_nature.dataset import load_paragraph
+from llm_nature.instrument import run_main
+
+def main():
+    text = load_paragraph() * 200
+    with tempfile.TemporaryDirectory() as tmp:
+        print("| k | fit s | save s | load s (mmap) | load s (read) | file KB |")
+        print("|---:|---:|---:|---:|---:|---:|")
+        for k in (1, 3, 8):
+            path = Path(tmp) / f"k{k}.bin"
+            t0 = time.perf_counter()
+            m = NGramModel(k=k, alpha=0.5)
+            m.fit_text(text)
+            t1 = time.perf_counter()
+            m.save(path)
+            t2 = time.perf_counter()
+            mapped = NGramModel.load(path)
+            t3 = time.perf_counter()
+            read = NGramModel.load(path, use_mmap=False)
+            t4 = time.perf_counter()
+
+            probe = NGramModel.build_pairs(load_paragraph(), k)
+            ref = m.log_prob_pairs(probe)
+            if mapped.log_prob_pairs(probe) != ref or read.log_prob_pairs(probe) != ref:
+                raise RuntimeError(f"k={k}: loaded model disagrees with fitted model")
+            kb = path.stat().st_size / 1024
+            print(f"| {k} | {t1 - t0:.3f} | {t2 - t1:.3f} | {t3 - t2:.4f} | {t4 - t3:.4f} | {kb:.1f} |")
+
+if __name__ == "__main__":
+    run_main(main)
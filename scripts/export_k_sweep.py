@@ -1,6 +1,5 @@
 from __future__ import annotations
 import csv
-import random
 from pathlib import Path
 import sys
 
@@ -8,14 +7,19 @@ ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
 
 from llm_nature.char_ngram import NGramModel
+from llm_nature.instrument import run_main
 from llm_nature.metrics import cross_entropy, perplexity, uniform_baseline_entropy
 from llm_nature.dataset import load_paragraph
+from llm_nature.resample import LeaveOutCounts, std_error, summarize
+
+PRUNE_BUDGET = 0.5  # pruned models keep this fraction of the count-table bytes
+FOLDS = 5
+# Bootstrap replicates; fixed, so the CSV does not depend on whether NumPy is installed
+# (both paths draw the same replicates for a seed).
+BOOTSTRAP = 200
 
 def split(pairs, frac=0.8, seed=42):
-    pairs = list(pairs)
-    random.Random(seed).shuffle(pairs)
-    n = int(len(pairs) * frac)
-    return pairs[:n], pairs[n:]
+    return pairs.shuffled_split(frac, seed)
 
 def main():
     base = load_paragraph()
@@ -26,7 +30,7 @@ def main():
     for N in Ns:
         text = base * N
         for k in Ks:
-            pairs = NGramModel.build_pairs(text, k)
+            pairs = NGramModel.pair_view(text, k)
             train, test = split(pairs)
 
             m = NGramModel(k=k, alpha=0.5)
@@ -38,6 +42,15 @@ def main():
             V = len(m.vocab)
             H_unif = uniform_baseline_entropy(V)
 
+            nbytes = m.nbytes()
+            m.prune(max_bytes=nbytes * PRUNE_BUDGET, method="entropy")
+            H_test_pruned = cross_entropy(m.prob, test)
+
+            lo = LeaveOutCounts(pairs, alpha=0.5)
+            cv = lo.kfold(FOLDS)
+            boot = lo.bootstrap(BOOTSTRAP)
+            H_test_boot, H_test_boot_lo, H_test_boot_hi = summarize([h for _, h in boot])
+
             out_rows.append({
                 "repeat": N,
                 "k": k,
@@ -50,6 +63,17 @@ def main():
                 "PP_unif": perplexity(H_unif),
                 "Delta_H": H_unif - H_test,
                 "Gap": H_test - H_train,
+                "bytes": nbytes,
+                "H_test_pruned": H_test_pruned,
+                "bytes_pruned": m.nbytes(),
+                "H_train_cv": sum(h for h, _ in cv) / FOLDS,
+                "H_test_cv": sum(h for _, h in cv) / FOLDS,
+                "H_test_cv_se": std_error([h for _, h in cv]),
+                "n_boot": BOOTSTRAP,
+                "H_train_boot": sum(h for h, _ in boot) / BOOTSTRAP,
+                "H_test_boot": H_test_boot,
+                "H_test_boot_lo": H_test_boot_lo,
+                "H_test_boot_hi": H_test_boot_hi,
             })
 
     out_path = ROOT / "out_k_sweep.csv"
@@ -61,4 +85,4 @@ def main():
     print(f"Wrote {out_path}")
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
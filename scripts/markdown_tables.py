@@ -2,8 +2,12 @@ from __future__ import annotations
 import csv
 from collections import defaultdict
 from pathlib import Path
+import sys
 
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from llm_nature.instrument import run_main
 
 def main():
     csv_path = ROOT / "out_k_sweep.csv"
@@ -42,4 +46,4 @@ def main():
     print(f"Wrote {out_path}")
 
 if __name__ == "__main__":
-    main()
+    run_main(main)
@@ -0,0 +1,15 @@
+from __future__ import annotations
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from llm_nature.experiments import Experiment, recall
+from llm_nature.instrument import run_main
+
+def main():
+    recall(Experiment())
+
+if __name__ == "__main__":
+    run_main(main)
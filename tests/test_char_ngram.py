@@ -1,4 +1,16 @@
-from llm_nature.char_ngram import NGramModel
+from collections import Counter
+import math
+import random
+import pytest
+
+from llm_nature.char_ngram import NGramModel, SCALAR_PAIRS
+from llm_nature.compact_ngram import CompactNGramModel
+from llm_nature.dataset import iter_paragraph_chunks, load_paragraph
+from llm_nature.metrics import cross_entropy
+from llm_nature.multi_order import MultiOrderNGram
+from llm_nature.smoothing import InterpolatedNGram
+from llm_nature.suffix_array import SuffixArrayIndex
+from llm_nature.word_ngram import WordNGram, tokenize
 
 def test_prob_sums_to_one_for_seen_context():
     text = "abababab"
@@ -12,3 +24,297 @@ def test_prob_sums_to_one_for_seen_context():
     for y in m.vocab:
         s += m.prob(ctx, y)
     assert abs(s - 1.0) < 1e-9
+
+def test_pair_view_matches_build_pairs_and_splits_offsets():
+    text = "the cat sat on the mat"
+    view = NGramModel.pair_view(text, 3)
+    assert list(view) == NGramModel.build_pairs(text, 3)
+    train, test = view.shuffled_split(0.8, seed=1)
+    assert len(train) + len(test) == len(view)
+    assert sorted(list(train) + list(test)) == sorted(view)
+    assert sorted(list(train.offsets) + list(test.offsets)) == list(range(len(view)))
+
+def test_from_repeated_matches_fit_on_repeated_text():
+    base = "abcab cab"
+    for N in (1, 2, 5):
+        for k in (1, 3, 9, 12):
+            ref = NGramModel(k=k, alpha=0.5)
+            ref.fit(NGramModel.build_pairs(base * N, k))
+            m = NGramModel.from_repeated(base, N, k)
+            assert m.counts == ref.counts
+            assert m.context_totals == ref.context_totals
+            assert m.vocab == ref.vocab
+
+def test_multi_order_views_match_per_order_models():
+    text = "the cat sat on the mat, the cat ran"
+    multi = MultiOrderNGram(k_max=4, alpha=0.5)
+    multi.fit(text)
+    for k in range(1, 5):
+        pairs = NGramModel.build_pairs(text, k)
+        ref = NGramModel(k=k, alpha=0.5)
+        ref.fit(pairs)
+        view = multi.order(k)
+        assert view.vocab == ref.vocab
+        assert view.counts == ref.counts
+        assert view.context_totals == ref.context_totals
+        for x, y in pairs + [("zz" * k, "q")]:
+            assert view.prob(x[:k], y) == ref.prob(x[:k], y)
+        assert view.log_prob_pairs(pairs) == ref.log_prob_pairs(pairs)
+
+def test_suffix_array_views_match_fitted_models():
+    text = "the cat sat on the mat, the cat sat"
+    idx = SuffixArrayIndex(text)
+    for k in (1, 2, 5, 12):
+        pairs = NGramModel.build_pairs(text, k)
+        ref = NGramModel(k=k, alpha=0.5)
+        ref.fit(pairs)
+        view = idx.order(k)
+        assert view.vocab == ref.vocab
+        for x, y in pairs + [(text[-k:], "t"), ("q" * k, "a")]:
+            assert view.prob(x, y) == ref.prob(x, y)
+
+    ref = WordNGram(k=2)
+    ref.fit_text(text)
+    ids = ref.vocab.encode(tokenize(text))
+    lm = WordNGram(k=2, model=SuffixArrayIndex(ids, packed=True).order(2), vocab=ref.vocab)
+    assert lm.score_answer_only("the cat", "sat on the mat") == ref.score_answer_only("the cat", "sat on the mat")
+    assert lm.model.counts == ref.model.counts
+
+def test_views_save_merge_and_size_like_fitted_models(tmp_path):
+    text = "the cat sat on the mat, the cat sat"
+    ref = NGramModel(k=3)
+    ref.fit_text(text)
+    multi = MultiOrderNGram(k_max=3)
+    multi.fit(text)
+    for view in (multi.order(3), SuffixArrayIndex(text).order(3)):
+        assert view.counts == ref.counts and view.context_totals == ref.context_totals
+        assert view.nbytes() == ref.nbytes()
+        view.save(tmp_path / "view.bin")
+        assert NGramModel.load(tmp_path / "view.bin").counts == ref.counts
+        m = NGramModel(k=3)
+        m.merge(view)
+        assert m.counts == ref.counts and m.vocab == ref.vocab
+
+def test_views_follow_refits_of_their_source():
+    multi = MultiOrderNGram(k_max=2)
+    multi.fit("abab")
+    v = multi.order(1)
+    assert v.top_next("a", 2)[0][0] == "b" and v.vocab_list() == ["a", "b"]
+    multi.fit("acacacac")
+    ref = NGramModel(k=1)
+    ref.fit(NGramModel.build_pairs("abab", 1) + NGramModel.build_pairs("acacacac", 1))
+    assert v.vocab_list() == sorted(v.vocab) == ["a", "b", "c"]
+    assert v.top_next("a", 2) == ref.top_next("a", 2)
+
+    idx = SuffixArrayIndex("abab")
+    s = idx.order(1)
+    assert s.successors("a") == (("b",), (2,)) and s.vocab_list() == ["a", "b"]
+    idx.build("acacacac")
+    assert s.successors("a") == (("c",), (4,)) and s.vocab_list() == ["a", "c"]
+    assert s.top_next("a", 1)[0][0] == "c"
+
+    for view in (v, s):
+        for mutate in (lambda: view.fit([("a", "b")]), lambda: view.prune(threshold=2),
+                       lambda: view.forget_counts({("a", "c"): 1})):
+            with pytest.raises(TypeError, match="read-only"):
+                mutate()
+
+def test_log_prob_pairs_scalar_and_batch_paths_agree():
+    pairs = NGramModel.build_pairs("the cat sat on the mat, the cat ran" * 3, 2)
+    m = NGramModel(k=2)
+    m.fit(pairs)
+    for n in (3, SCALAR_PAIRS, len(pairs)):
+        ref = sum(math.log(m.prob(x, y)) for x, y in pairs[:n])
+        assert abs(m.log_prob_pairs(pairs[:n]) - ref) < 1e-9
+    m.counts[pairs[0]] = -5  # corrupt count: p < 0 must raise on both paths
+    for n in (3, len(pairs)):
+        with pytest.raises(ValueError, match="Non-positive"):
+            m.log_prob_pairs(pairs[:n])
+    with pytest.raises(ValueError, match="Non-positive"):
+        m.log_prob_batch([pairs[0][0]], [pairs[0][1]])
+
+def test_parallel_fit_and_merge_match_serial(monkeypatch):
+    text = "abracadabra, cadabra abra! " * 20
+    k = 3
+    ref = NGramModel(k=k, alpha=0.5)
+    ref.fit(NGramModel.build_pairs(text, k))
+
+    par = NGramModel(k=k, alpha=0.5)
+    par.fit_text(text, workers=3)
+    assert list(par.counts.items()) == list(ref.counts.items())
+    assert par.context_totals == ref.context_totals
+    assert par.vocab == ref.vocab
+
+    # Only PairViews are sharded; a materialized pair list is counted in this process.
+    def no_pool(self, pairs, workers):
+        raise AssertionError("fit_parallel called for a pair list")
+    for cls in (NGramModel, CompactNGramModel):
+        with monkeypatch.context() as mp:
+            mp.setattr(cls, "fit_parallel", no_pool)
+            serial = cls(k=k, alpha=0.5)
+            serial.fit(NGramModel.build_pairs(text, k), workers=3)
+        assert serial.counts == ref.counts and serial.vocab == ref.vocab
+
+    cut = 100
+    merged = CompactNGramModel(k=k, alpha=0.5)
+    merged.fit(NGramModel.build_pairs(text[:cut + k], k))
+    tail = NGramModel(k=k, alpha=0.5)
+    tail.fit(NGramModel.build_pairs(text[cut:], k))
+    merged.merge(tail)
+    assert merged.counts == ref.counts
+    assert merged.vocab == ref.vocab
+
+def test_stream_fits_match_whole_text_fits(monkeypatch):
+    text = load_paragraph()
+    for k in (1, 4):
+        ref = NGramModel(k=k)
+        ref.fit_text(text)
+        m = NGramModel(k=k)
+        m.fit_stream(iter_paragraph_chunks(size=7))
+        assert m.counts == ref.counts and m.context_totals == ref.context_totals
+
+        wref = WordNGram(k=k)
+        wref.fit_text(text)
+        w = WordNGram(k=k)
+        w.fit_stream(text[i:i + 5] for i in range(0, len(text), 5))
+        assert w.model.counts == wref.model.counts
+        assert len(w.ids) == k and w.n_tokens == len(wref.ids)
+
+    builds = []
+    build = InterpolatedNGram.build
+    monkeypatch.setattr(InterpolatedNGram, "build", lambda self: builds.append(1) or build(self))
+    ref = InterpolatedNGram(k=3)
+    ref.fit_text(text)
+    m = InterpolatedNGram(k=3)
+    m.fit_stream(iter_paragraph_chunks(size=7))
+    assert not builds  # tables are rebuilt once, on the first query, not per chunk
+    assert [m.prob(x, y) for x, y in list(ref.counts)[:50]] == [ref.prob(x, y) for x, y in list(ref.counts)[:50]]
+    assert len(builds) == 2
+
+def test_forget_keeps_vocab_of_targets_still_seen():
+    text = "the cat sat on the mat; a dog barked."
+    pairs = NGramModel.build_pairs(text, 2)
+    m = NGramModel(k=2)
+    m.fit(pairs[:10])
+    half = NGramModel(k=2)
+    half.fit(pairs[10:20])
+    m.merge(half)
+    m.fit_counts({key: 1 for key in pairs[20:]})
+    for cut in range(0, len(pairs), 7):
+        m.forget(pairs[cut:cut + 7])
+        ref = NGramModel(k=2)
+        ref.fit(pairs[cut + 7:])
+        assert m.vocab == ref.vocab and m.target_pairs == ref.target_pairs
+
+def test_word_fit_text_calls_are_independent():
+    w = WordNGram(k=2)
+    w.fit_text("the cat sat")
+    w.fit_text("on the mat")
+    assert sum(w.model.counts.values()) == 2
+    joined = WordNGram(k=2)
+    joined.fit_text("the cat sat")
+    joined.update_text("on the mat")
+    ref = WordNGram(k=2)
+    ref.fit_text("the cat sat on the mat")
+    assert sum(joined.model.counts.values()) == 4 and joined.model.counts == ref.model.counts
+
+def test_prune_threshold_and_budget_keep_probs_normalised():
+    pairs = NGramModel.build_pairs(load_paragraph(), 3)
+    for cls in (NGramModel, CompactNGramModel):
+        m = cls(k=3)
+        m.fit(pairs)
+        vocab = set(m.vocab)
+        singletons = sum(c == 1 for c in m.counts.values())
+        assert m.prune(threshold=2) == singletons
+        assert min(m.counts.values()) >= 2 and m.vocab == vocab
+        for x in list(m.context_totals)[:5] + ["zzz"]:
+            assert abs(sum(m.prob(x, y) for y in m.vocab) - 1.0) < 1e-9
+
+        m = cls(k=3)
+        m.fit(pairs)
+        budget = m.nbytes() // 3
+        m.prune(max_bytes=budget, method="entropy")
+        assert m.nbytes() <= budget * 1.1
+        totals = {}
+        for (x, _), c in m.counts.items():
+            totals[x] = totals.get(x, 0) + c
+        assert m.context_totals == totals
+
+def test_compact_prune_works_on_packed_arrays(monkeypatch):
+    pairs = NGramModel.build_pairs(load_paragraph(), 3)
+    ref = NGramModel(k=3)
+    ref.fit(pairs)
+    median = sorted(ref.prune_scores("entropy").values())[len(ref.counts) // 2]
+    for kwargs in ({"threshold": 2}, {"threshold": median, "method": "entropy"}):
+        ref = NGramModel(k=3)
+        ref.fit(pairs)
+        m = CompactNGramModel(k=3)
+        m.fit(pairs)
+        with monkeypatch.context() as mp:
+            mp.setattr(CompactNGramModel, "counts", property(lambda self: 1 / 0))
+            assert m.prune(**kwargs) == ref.prune(**kwargs)
+        assert m.counts == ref.counts and m.context_totals == ref.context_totals
+
+    m = InterpolatedNGram(k=3)
+    m.fit(pairs)
+    with pytest.raises(ValueError):
+        m.prune(max_bytes=1000, method="entropy")
+    assert m.prune(threshold=2) > 0
+    assert abs(sum(m.prob("the", y) for y in m.vocab) - 1.0) < 1e-9
+
+def test_interpolated_estimators_normalise_and_plug_in():
+    text = load_paragraph()
+    train, test = NGramModel.pair_view(text * 2, 4).shuffled_split(0.8, 42)
+    lap = NGramModel(k=4)
+    lap.fit(train)
+    for method in ("kneser-ney", "witten-bell"):
+        m = InterpolatedNGram(k=4, method=method)
+        m.fit(train)
+        for x in list(m.context_totals)[:5] + ["#qz!"]:
+            assert abs(sum(m.prob(x, y) for y in m.vocab) - 1.0) < 1e-9
+        assert cross_entropy(m.prob, test) < cross_entropy(lap.prob, test)
+        assert abs(m.log_prob_text(text[:50]) - sum(
+            math.log(m.prob(x, y)) for x, y in NGramModel.build_pairs(text[:50], 4))) < 1e-9
+
+        w = WordNGram(k=2, model=InterpolatedNGram(k=2, method=method))
+        w.fit_text(text)
+        lp, n = w.score_answer_only("what are models", "large language models")
+        assert n > 0 and lp < 0
+
+def test_generate_samples_from_prob():
+    text = load_paragraph()
+    for cls in (NGramModel, CompactNGramModel):
+        m = cls(k=2, alpha=0.1)
+        m.fit_text(text)
+        assert m.generate("La", 30, seed=7) == m.generate("La", 30, seed=7)
+        assert len(m.generate_batch(["La", "x", ""], 12, seed=1)[2]) == 12
+        ys, cs = m.successors("la")
+        assert m.generate("la", 1, temperature=0) == ys[cs.index(max(cs))]
+
+        draws = Counter(m.sample_next(["la"] * 20000, random.Random(0)))
+        for y in ys:
+            assert abs(draws[y] / 20000 - m.prob("la", y)) < 0.02
+
+    w = WordNGram(k=2)
+    w.fit_text(text)
+    out = w.generate("large language", 10, seed=3)
+    assert len(out.split()) == 10 and all(t in w.vocab for t in out.split())
+
+def test_distribution_and_top_next_match_prob():
+    text = load_paragraph()
+    multi = MultiOrderNGram(3)
+    multi.fit(text)
+    models = [multi.order(3), SuffixArrayIndex(text).order(3), InterpolatedNGram(k=3)]
+    for cls in (NGramModel, CompactNGramModel):
+        models.append(cls(k=3))
+    for m in models[2:]:
+        m.fit_text(text)
+    for m in models:
+        vocab = m.vocab_list()
+        for x in ("the", "ode", "#q!"):
+            dist = list(m.distribution(x))
+            assert all(abs(p - m.prob(x, y)) < 1e-12 for p, y in zip(dist, vocab))
+            assert abs(sum(dist) - 1.0) < 1e-9
+            top = m.top_next(x, 5)
+            ref = sorted(range(len(vocab)), key=lambda i: (-dist[i], i))[:5]
+            assert [y for y, _ in top] == [vocab[i] for i in ref]
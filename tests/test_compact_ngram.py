@@ -0,0 +1,88 @@
+import math
+import pickle
+import pytest
+
+from llm_nature.char_ngram import NGramModel
+from llm_nature.compact_ngram import CompactNGramModel
+from llm_nature.dataset import load_paragraph
+from llm_nature.smoothing import InterpolatedNGram
+from llm_nature.word_ngram import WordNGram
+
+def test_compact_matches_dict_model():
+    text = load_paragraph() * 3
+    for k in (1, 3, 8):
+        pairs = NGramModel.build_pairs(text, k)
+        ref = NGramModel(k=k, alpha=0.5)
+        ref.fit(pairs)
+        m = CompactNGramModel(k=k, alpha=0.5)
+        m.fit(pairs[:100])
+        probe = pairs[:100:9] + pairs[100::53]
+        before = [m.prob(x, y) for x, y in probe]  # fills the context-row memo
+        m.fit(pairs[100:])
+        assert [m.prob(x, y) for x, y in probe] != before
+        assert m.vocab == ref.vocab
+        assert m.counts == ref.counts
+        assert m.context_totals == ref.context_totals
+        for x, y in pairs[::7] + [("z" * k, "q"), ("?" * k, "a")]:
+            assert m.prob(x, y) == ref.prob(x, y)
+        assert m.log_prob_pairs(pairs) == ref.log_prob_pairs(pairs)
+        assert m.log_prob_text("Large models") == ref.log_prob_text("Large models")
+        m.forget_counts({pairs[0]: 1})
+        ref.forget_counts({pairs[0]: 1})
+        assert [m.prob(x, y) for x, y in probe] == [ref.prob(x, y) for x, y in probe]
+
+        # Rolled codes (fit_text runs, consecutive pairs) match pair-by-pair encoding.
+        full = NGramModel.from_repeated(text, 1, k)
+        for fit in (lambda c: c.fit_text(text), lambda c: c.fit(pairs[::-1])):
+            c = CompactNGramModel(k=k, alpha=0.5)
+            fit(c)
+            assert c.counts == full.counts
+        c = pickle.loads(pickle.dumps(c))
+        c.ROW_CACHE = 8
+        c._invalidate()
+        assert [c.prob(x, y) for x, y in probe] == [full.prob(x, y) for x, y in probe]
+        assert c._row.cache_info().currsize <= 8
+
+def test_log_prob_batch_matches_prob():
+    pairs = NGramModel.build_pairs(load_paragraph(), 3)
+    for cls in (NGramModel, CompactNGramModel):
+        m = cls(k=3, alpha=0.5)
+        m.fit(pairs[:200])
+        xs = [x for x, _ in pairs] + ["zzz"]
+        ys = [y for _, y in pairs] + ["a"]
+        lps = m.log_prob_batch(xs, ys)
+        assert len(lps) == len(xs)
+        for lp, x, y in zip(lps, xs, ys):
+            assert abs(lp - math.log(m.prob(x, y))) < 1e-12
+
+def test_save_load_round_trip(tmp_path):
+    text = load_paragraph()
+    pairs = NGramModel.build_pairs(text, 3)
+    ref = NGramModel(k=3, alpha=0.5)
+    ref.fit(pairs)
+    ref.save(tmp_path / "char.bin")
+    for use_mmap in (True, False):
+        m = NGramModel.load(tmp_path / "char.bin", use_mmap=use_mmap)
+        assert m.counts == ref.counts and m.vocab == ref.vocab
+        assert m.log_prob_pairs(pairs) == ref.log_prob_pairs(pairs)
+        assert m.prob("zzz", "a") == ref.prob("zzz", "a")
+
+    w = WordNGram(k=2)
+    w.fit_text(text)
+    w.save(tmp_path / "word.bin")
+    w2 = WordNGram.load(tmp_path / "word.bin")
+    assert w2.vocab.tokens == w.vocab.tokens
+    assert w2.score_answer_only("what are models", "large models") == \
+        w.score_answer_only("what are models", "large models")
+
+def test_interpolated_models_refuse_to_save(tmp_path):
+    text = load_paragraph()
+    kn = InterpolatedNGram(k=3)
+    kn.fit_text(text)
+    w = WordNGram(k=2, model=InterpolatedNGram(k=2))
+    w.fit_text(text)
+    # The file format holds Laplace counts only: a round trip would change every prob.
+    for m in (kn, w):
+        with pytest.raises(TypeError, match="Laplace counts only"):
+            m.save(tmp_path / "m.bin")
+    assert not (tmp_path / "m.bin").exists()
@@ -1,4 +1,11 @@
+import random
+
+from llm_nature import instrument
+from llm_nature.char_ngram import NGramModel
+from llm_nature.dataset import QAItem
 from llm_nature.metrics import cross_entropy, perplexity
+from llm_nature.qa import QAReranker
+from llm_nature.resample import LeaveOutCounts, _draw, summarize
 
 def test_cross_entropy_and_pp():
     pairs = [("a","b"), ("a","b")]
@@ -7,3 +14,59 @@ def test_cross_entropy_and_pp():
     assert abs(H - (-__import__("math").log(0.25))) < 1e-12
     PP = perplexity(H)
     assert abs(PP - 4.0) < 1e-12
+
+def test_cross_entropy_dispatches_to_batch():
+    pairs = NGramModel.build_pairs("abracadabra abracadabra", 2)
+    m = NGramModel(k=2, alpha=0.5)
+    m.fit(pairs[:10])
+    H_batch = cross_entropy(m.prob, pairs)
+    H_loop = cross_entropy(lambda x, y: m.prob(x, y), pairs)
+    assert abs(H_batch - H_loop) < 1e-12
+
+def test_instrumentation_counts_only_when_enabled():
+    pairs = NGramModel.build_pairs("abracadabra", 2)
+    m = NGramModel(k=2)
+    with instrument.collecting() as stats:
+        m.fit(pairs)
+        assert stats.counters["pairs.fit"] == len(pairs)
+        cross_entropy(m.prob, pairs + [("zz", "a")])
+        rr = QAReranker(k=2)
+        rr.fit([QAItem(q="What is X?", a="X is a thing."), QAItem(q="Why?", a="Because.")])
+        rr.answer("What is X?")
+    assert instrument.STATS is None
+    assert stats.counters["lookup.pairs"] >= len(pairs) + 1
+    assert stats.counters["lookup.unseen_context"] >= 1
+    assert stats.counters["qa.items_scored"] == 2 and stats.calls["qa.score.lm"] == 2
+    assert "qa.score.lm" in stats.report()
+
+    with instrument.collecting() as stats:
+        rr.rank("Why?")
+        rr.answer_batch(["Why?"])
+    # rank and answer_batch time the shared stages too (one LM batch for answer_batch).
+    assert stats.calls["qa.score.lm"] == 3 and stats.calls["qa.score.combine"] == 3
+
+    fitted = stats.counters["pairs.fit"]
+    m.fit(pairs)
+    assert stats.counters["pairs.fit"] == fitted
+
+def test_leave_out_counts_match_refits():
+    pairs = list(NGramModel.pair_view("the cat sat on the mat; the dog sat on the log.", 2))
+    lo = LeaveOutCounts(pairs, alpha=0.5)
+    for fold, (h_train, h_test) in zip(lo.folds(4, seed=1), lo.kfold(4, seed=1)):
+        held = set(fold)
+        train = [p for i, p in enumerate(pairs) if i not in held]
+        m = NGramModel(k=2, alpha=0.5)
+        m.fit(train)
+        assert abs(h_train - cross_entropy(m.prob, train)) < 1e-9
+        assert abs(h_test - cross_entropy(m.prob, [pairs[i] for i in fold])) < 1e-9
+    drawn = [int(i) for i in _draw(random.Random(3), len(pairs))]
+    m = NGramModel(k=2, alpha=0.5)
+    m.fit([pairs[i] for i in drawn])
+    oob = [p for i, p in enumerate(pairs) if i not in set(drawn)]
+    h_train, h_test = lo.bootstrap(1, seed=3)[0]
+    assert abs(h_train - cross_entropy(m.prob, [pairs[i] for i in drawn])) < 1e-9
+    assert abs(h_test - cross_entropy(m.prob, oob)) < 1e-9
+    boot = lo.bootstrap(50, seed=3)
+    assert len(boot) == 50 and all(h_train < h_test for h_train, h_test in boot)
+    mean, lo_, hi = summarize([h for _, h in boot])
+    assert lo_ <= mean <= hi
@@ -1,5 +1,14 @@
-from llm_nature.dataset import QAItem
-from llm_nature.qa import QAReranker
+import random
+import pytest
+
+from llm_nature.cache import ResultCache
+from llm_nature.compact_ngram import CompactNGramModel
+from llm_nature.dataset import QAItem, load_qa_corpus
+from llm_nature.experiments import Experiment
+from llm_nature.grid import grid_matrices, upper_envelope
+from llm_nature.pairs import unpack_context
+from llm_nature.qa import QAReranker, jaccard
+from llm_nature.word_ngram import Vocabulary, WordNGram, tokenize, tokenize_ids
 
 def test_qa_runs_and_returns_item():
     items = [
@@ -10,3 +19,198 @@ def test_qa_runs_and_returns_item():
     rr.fit(items)
     ans = rr.answer("What is X?")
     assert ans.a in {"X is a thing.", "Y is a thing."}
+
+def test_fit_orders_matches_separate_fits():
+    items = [
+        QAItem(q="What is X?", a="X is a thing that we know."),
+        QAItem(q="What is Y?", a="Y is a thing that we do not know."),
+    ]
+    shared = QAReranker.fit_orders(items, [1, 2, 3], alpha=0.5, lam=0.1)
+    for k, rr in shared.items():
+        ref = QAReranker(k=k, alpha=0.5, lam=0.1)
+        ref.fit(items)
+        for it in items:
+            assert rr.score("What is X?", it) == ref.score("What is X?", it)
+
+def test_grid_winners_match_answer():
+    items = [
+        QAItem(q="What is X?", a="X is a thing that we know."),
+        QAItem(q="What is Y?", a="Y is a thing that we do not know."),
+        QAItem(q="Is Z real?", a="Z is a thing."),
+    ]
+    questions = ["What is X?", "Is Z a thing?"]
+    serial = grid_matrices(items, questions, [1, 2], alpha=0.5)
+    pooled = grid_matrices(items, questions, [1, 2], alpha=0.5, workers=2)
+    for k in (1, 2):
+        assert pooled[k].base == serial[k].base and pooled[k].sim == serial[k].sim
+        for lam in (0.0, 0.5, 5.0):
+            rr = QAReranker(k=k, alpha=0.5, lam=lam)
+            rr.fit(items)
+            got = [items[j] for j in serial[k].winners(lam)]
+            assert got == [rr.answer(q) for q in questions]
+
+def test_cached_answer_scores_match_reference():
+    items = [
+        QAItem(q="What is X?", a="X is a thing that we know."),
+        QAItem(q="What is Y?", a="Y."),
+        QAItem(q="Tagged?", a="the atag marker appears here"),
+    ]
+    for k in (1, 2, 4):
+        rr = QAReranker(k=k, alpha=0.5, lam=0.3)
+        rr.fit(items)
+        for q in ("What is X?", "", "Y is what"):
+            for it in items:
+                lp, n = rr.lm.score_answer_only(q, it.a)
+                assert (lp, n) == rr.lm._score_full(tokenize_ids(f"qtag {q} atag {it.a}", rr.lm.vocab))
+                _, base, _, n_cached = rr.score(q, it)
+                assert n_cached == n
+                assert abs(base - (lp / n if n else lp)) < 1e-9
+
+def test_retrieval_candidates_and_recall():
+    items = [
+        QAItem(q="What is X?", a="X is a thing."),
+        QAItem(q="What is Y?", a="Y is a thing."),
+        QAItem(q="Why is the sky blue?", a="Scattering."),
+        QAItem(q="Unrelated words entirely", a="Nothing."),
+    ]
+    rr = QAReranker(k=2, alpha=0.5, lam=1.0, top_n=2)
+    rr.fit(items)
+    q_set = set(tokenize("What is the sky?"))
+    exact = {j: jaccard(q_set, set(tokenize(it.q))) for j, it in enumerate(items)}
+    assert rr.index.jaccard(q_set) == {j: s for j, s in exact.items() if s > 0}
+    assert rr.candidates("What is the sky?") == [0, 2]
+    assert rr.answer("What is the sky?") in (items[0], items[2])
+    assert rr.candidate_recall(["What is X?", "What is the sky?"], top_n=len(items)) == 1.0
+
+def test_answer_batch_matches_looped_scores():
+    items = [
+        QAItem(q="What is X?", a="X is a thing that we know."),
+        QAItem(q="What is Y?", a="Y is a thing that we do not know."),
+        QAItem(q="Is Z?", a="Z."),
+        QAItem(q="What is X?", a="X is a thing that we know."),
+    ]
+    queries = ["What is X?", "Is Z a thing?", "What is X?", ""]
+    for k in (1, 3):
+        rr = QAReranker(k=k, alpha=0.5, lam=0.4)
+        rr.fit(items)
+        batch = rr.answer_batch(queries, top_k=len(items))
+        for q, ranked in zip(queries, batch):
+            assert ranked[0].item is rr.answer(q)
+            assert [r.index for r in ranked] == sorted(range(len(items)), key=lambda j: -rr.score(q, items[j])[0])
+            for r in ranked:
+                total, base, sim, n = rr.score(q, r.item)
+                assert abs(r.total - total) < 1e-9 and r.sim == sim and r.n == n
+
+def test_rank_dedupes_rows_and_matches_scores():
+    items = [
+        QAItem(q="What is X?", a="X is a thing that we know."),
+        QAItem(q="Why X?", a="Because."),
+        QAItem(q="What is X?", a="X is a thing that we know."),
+        QAItem(q="Why X?", a="Because."),
+        QAItem(q="Why X?", a="Because."),
+    ]
+    rr = QAReranker(k=2, alpha=0.5, lam=0.3)
+    rr.fit(items)
+    ranked = rr.rank("What is X?")
+    assert sorted((r.index, r.count) for r in ranked) == [(0, 2), (1, 3)]
+    assert ranked[0].item is rr.answer("What is X?")
+    for r in ranked:
+        assert (r.total, r.base, r.sim, r.n) == rr.score("What is X?", r.item)
+    assert rr.rank("What is X?", n=1) == ranked[:1]
+
+def test_word_ngram_keys_contexts_by_packed_ids():
+    vocab = Vocabulary(["a", "b"])
+    assert vocab.encode(["a", "zzz", "b"]).tolist() == [1, Vocabulary.UNK, 2]
+    assert vocab.decode([1, 2]) == ["a", "b"]
+    assert vocab.encode(["c", "a", "d", "c"], grow=True).tolist() == [3, 1, 4, 3]
+
+    lm = WordNGram(k=2)
+    lm.fit_text("the cat sat on the mat the cat ran")
+    ctx = lm.context(["the", "cat"])
+    assert lm.model.counts[(ctx, lm.vocab.get("sat"))] == 1
+    assert lm.model.context_totals[ctx] == 2
+    assert all(isinstance(x, int) for x, _ in lm.model.counts)
+    lp, n = lm.score_answer_only("the cat", "sat on the mat")
+    assert n == 4 and lp < 0
+
+def test_add_and_remove_items_match_refit():
+    items = load_qa_corpus()
+    for k in (1, 3):
+        rr = QAReranker(k=k, alpha=0.5, lam=0.2)
+        rr.fit(iter(items[:10]), batch=3)
+        scored = []
+        rescore = rr.lm.answer_interior
+        rr.lm.answer_interior = lambda a_ids: scored.append(a_ids) or rescore(a_ids)
+        rr.add_items(items[10:])
+        # Only the new answers are scored; old interiors wait until a query reads them.
+        assert len(scored) == len({it.a for it in items[10:]} - {it.a for it in items[:10]})
+        del rr.lm.answer_interior
+        drop = {0, 1, 5, len(items) - 1}
+        rr.remove_items(drop)
+        rest = [it for j, it in enumerate(items) if j not in drop]
+        ref = QAReranker(k=k, alpha=0.5, lam=0.2)
+        ref.fit(rest)
+        def decoded(lm):
+            return {(tuple(lm.vocab.decode(unpack_context(x, k))), lm.vocab.tokens[y]): c
+                    for (x, y), c in lm.model.counts.items()}
+        assert decoded(rr.lm) == decoded(ref.lm)
+        assert len(rr.lm.model.vocab) == len(ref.lm.model.vocab)
+        assert rr.items == ref.items and rr.row_count == ref.row_count
+        for q in ("What is a large language model?", "why scale"):
+            assert [(r.index, r.total) for r in rr.rank(q)] == [(r.index, r.total) for r in ref.rank(q)]
+
+    m = CompactNGramModel(k=2)
+    m.fit([("ab", "c"), ("ab", "d"), ("bc", "d")])
+    m.forget([("ab", "d"), ("bc", "d")])
+    assert m.counts == {("ab", "c"): 1} and m.vocab == {"c"}
+
+def test_ad_hoc_items_score_like_a_fresh_reranker():
+    items = [
+        QAItem(q="What is X?", a="X is a thing that we know."),
+        QAItem(q="What is Y?", a="Y is a thing that we do not know."),
+    ]
+    extra = [QAItem(q="Is Z real?", a="Z is a thing.")]
+    words = "a thing that we know do not is X Y Z".split()
+    rr = QAReranker(k=2, alpha=0.5, lam=0.3)
+    rr.fit(items)
+    rr.add_items(extra)
+    for i in range(300):
+        # Each throwaway item is freed after score(), so its arrays' ids get reused.
+        item = QAItem(q="What is X?", a=" ".join(words[(i * j) % len(words)] for j in range(1, 2 + i % 7)))
+        ref = QAReranker(k=2, alpha=0.5, lam=0.3)
+        ref.fit(items + extra)
+        assert rr.score("What is X?", item) == ref.score("What is X?", item)
+    assert len(rr._interiors) <= len({it.a for it in items + extra})
+
+def test_experiment_cache_reuses_fits(tmp_path, monkeypatch):
+    cold = Experiment(cache=ResultCache(tmp_path))
+    ms = cold.matrices([1, 3])
+    ref = cold.reranker(3)
+    for k, m in Experiment(workers=2).matrices([1, 3]).items():
+        assert (m.base, m.sim, m.n) == (ms[k].base, ms[k].sim, ms[k].n)
+
+    def refit(*args, **kwargs):
+        raise AssertionError("cached results should not be refitted")
+    monkeypatch.setattr(QAReranker, "fit_orders", refit)
+    warm = Experiment(cache=ResultCache(tmp_path))
+    for k, m in warm.matrices([1, 3]).items():
+        assert (m.base, m.sim, m.n) == (ms[k].base, ms[k].sim, ms[k].n)
+    q = "What is perplexity?"
+    assert [(r.index, r.total) for r in warm.reranker(3).rank(q)] == [(r.index, r.total) for r in ref.rank(q)]
+    with pytest.raises(AssertionError):
+        Experiment(alpha=0.25, cache=ResultCache(tmp_path)).matrices([1])
+
+def test_upper_envelope_matches_rescans():
+    rng = random.Random(0)
+    for _ in range(200):
+        n = rng.randint(1, 12)
+        # Few distinct values, so equal slopes, equal lines and multi-line ties all occur.
+        base = [rng.choice([-2.0, -1.5, -1.0, -0.5]) for _ in range(n)]
+        sim = [rng.choice([0.0, 0.25, 0.5, 1.0]) for _ in range(n)]
+        env = upper_envelope(base, sim)
+        assert env.breaks == sorted(env.breaks)
+        for lam in env.breaks + [rng.uniform(-5, 5) for _ in range(20)]:
+            totals = [b + lam * s for b, s in zip(base, sim)]
+            assert env.winner(lam) == max(range(n), key=totals.__getitem__)
+        spans = env.intervals(lo=0.0, hi=3.0)
+        assert spans[0][0] == 0.0 and spans[-1][1] == 3.0